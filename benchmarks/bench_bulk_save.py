@@ -0,0 +1,112 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" Benchmark - saving articles by session.merge loop vs
+db.bulk_save_articles.
+
+Usage:
+    bench_bulk_save.py [number of articles]
+
+Copyright (c) Karol Będkowski, 2015
+
+This file is part of mna
+Licence: GPLv2+
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2015"
+__version__ = "2015-06-13"
+
+import sys
+import datetime
+
+import bench_support
+
+
+def _create_source():
+    from mna.model import db
+    from mna.model import dbobjects as DBO
+    session = db.Session()
+    source = DBO.Source()
+    source.name = "mna.plugins.rss.RssSource"
+    source.title = "bench"
+    source.conf = {}
+    source.group_id = 1
+    session.add(source)
+    session.commit()
+    return source.oid
+
+
+def _create_articles(count, suffix=""):
+    from mna.model import dbobjects as DBO
+    now = datetime.datetime.now()
+    articles = []
+    for idx in xrange(count):
+        art = DBO.Article()
+        art.internal_id = u"http://localhost/art/%d" % idx
+        art.title = u"Article %d%s" % (idx, suffix)
+        art.content = u"Content of article %d%s. " % (idx, suffix) * 20
+        art.summary = u"Summary %d" % idx
+        art.link = u"http://localhost/art/%d" % idx
+        art.updated = art.published = now
+        art.score = 0
+        art.read = 0
+        art.meta = {'content_hash': str(idx) + suffix}
+        articles.append(art)
+    return articles
+
+
+def _save_merge(session, source_id, articles):
+    for article in articles:
+        article.source_id = source_id
+        session.merge(article)
+
+
+def _save_bulk(session, source_id, articles):
+    from mna.model import db
+    db.bulk_save_articles(session, source_id, articles)
+
+
+def _measure(func, source_id, count, suffix):
+    from mna.model import db
+    from mna.model import dbobjects as DBO
+    articles = _create_articles(count, suffix)
+    session = db.Session()
+    # existing articles are updated
+    oids = dict(session.query(DBO.Article.internal_id, DBO.Article.oid).
+                filter_by(source_id=source_id))
+    for art in articles:
+        art.oid = oids.get(art.internal_id)
+    with bench_support.Timer() as timer:
+        func(session, source_id, articles)
+        session.commit()
+    db.Session.remove()
+    return "time=%.3fs rows/s=%.0f" % (timer.elapsed, count / timer.elapsed)
+
+
+def _clear_articles():
+    from mna.model import db
+    from mna.model import dbobjects as DBO
+    session = db.Session()
+    session.query(DBO.Article).delete()
+    session.commit()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    tmpdir = bench_support.setup_env()
+    try:
+        source_id = _create_source()
+        rows = []
+        for name, func in (('merge', _save_merge), ('bulk', _save_bulk)):
+            _clear_articles()
+            rows.append((name + " insert",
+                         _measure(func, source_id, count, "")))
+            rows.append((name + " update",
+                         _measure(func, source_id, count, " (upd)")))
+        bench_support.print_results("Saving %d articles" % count, rows)
+    finally:
+        bench_support.cleanup_env(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" Benchmark - refresh cycle time for N rss sources served by local mock
+http server; compare workers engines.
+
+Usage:
+    bench_fetch_engine.py [number of sources] [server delay in sec]
+
+Copyright (c) Karol Będkowski, 2015
+
+This file is part of mna
+Licence: GPLv2+
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2015"
+__version__ = "2015-06-10"
+
+import sys
+import datetime
+import Queue
+
+import bench_support
+
+# queues stats for each cycle
+_QUEUE_STATS = []
+
+
+def _create_sources(server_url, count):
+    from mna.model import db
+    from mna.model import dbobjects as DBO
+    session = db.Session()
+    session.query(DBO.Article).delete()
+    session.query(DBO.Source).delete()
+    for idx in xrange(count):
+        source = DBO.Source()
+        source.name = "mna.plugins.rss.RssSource"
+        source.title = "bench %d" % idx
+        source.conf = {"url": "%s/feed/%d" % (server_url, idx)}
+        source.group_id = 1
+        source.meta = {}
+        session.add(source)
+    session.commit()
+    return [oid for oid, in session.query(DBO.Source.oid)]
+
+
+def _reset_sources():
+    from mna.model import db
+    from mna.model import dbobjects as DBO
+    session = db.Session()
+    session.query(DBO.Article).delete()
+    session.query(DBO.Source).update(
+        {"next_refresh": datetime.datetime.now() -
+         datetime.timedelta(minutes=1),
+         "last_refreshed": None, "meta": None})
+    session.commit()
+
+
+def _run_cycle(engine, sources):
+    from mna.lib import appconfig
+    from mna.logic import worker
+    aconf = appconfig.AppConfig()
+    aconf['workers.engine'] = engine
+    _reset_sources()
+    update_q = Queue.Queue()
+    gui_q = Queue.Queue()
+    workers_cnt = worker.get_workers_count(aconf)
+    pipeline = worker.UpdatePipeline(update_q, gui_q)
+    pipeline.start(aconf)
+    with bench_support.Timer() as timer:
+        for source_id in sources:
+            update_q.put(source_id)
+        update_q.join()
+    pipeline.stop()
+    stats = pipeline.get_stats()
+    _QUEUE_STATS.append((engine, stats))
+    errors = sum(1 for cmd, _args in gui_q.queue
+                 if cmd == 'source_update_error')
+    return workers_cnt, timer.elapsed, errors
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    tmpdir = bench_support.setup_env()
+    server = bench_support.MockHttpServer(
+        lambda path: (200, {'Content-Type': 'application/rss+xml'},
+                      bench_support.rss_feed(path.replace('/', '_'))),
+        delay).start()
+    try:
+        sources = _create_sources(server.url, count)
+        rows = []
+        for engine in ('threads', 'concurrent'):
+            workers, elapsed, errors = _run_cycle(engine, sources)
+            rows.append((engine, "workers=%d time=%.2fs sources/s=%.1f "
+                         "errors=%d" % (workers, elapsed, count / elapsed,
+                                        errors)))
+        bench_support.print_results(
+            "Refresh cycle: %d sources, server delay %.2fs" % (count, delay),
+            rows)
+        bench_support.print_results(
+            "Pipeline queues",
+            [(engine, " ".join("%s=%r" % (name, stat) for name, stat
+                               in sorted(stats.iteritems())))
+             for engine, stats in _QUEUE_STATS])
+    finally:
+        server.stop()
+        bench_support.cleanup_env(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
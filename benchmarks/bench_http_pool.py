@@ -0,0 +1,90 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" Benchmark - connection reuse when many feeds from one host are
+downloaded by worker threads: shared pool (websupport) vs new connection
+for each request.
+
+Usage:
+    bench_http_pool.py [number of feeds] [threads] [host limit]
+
+Copyright (c) Karol Będkowski, 2015
+
+This file is part of mna
+Licence: GPLv2+
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2015"
+__version__ = "2015-06-14"
+
+import sys
+import threading
+import urllib2
+import Queue
+
+import bench_support
+
+
+def _download_new_connection(url):
+    conn = urllib2.urlopen(url, timeout=10)
+    try:
+        return conn.read()
+    finally:
+        conn.close()
+
+
+def _download_pooled(url):
+    from mna.lib import websupport
+    return websupport.download_page(url)[1]
+
+
+def _run(server, func, urls, threads):
+    tasks = Queue.Queue()
+    for url in urls:
+        tasks.put(url)
+
+    def worker():
+        while True:
+            try:
+                url = tasks.get(False)
+            except Queue.Empty:
+                return
+            assert func(url)
+
+    server.requests = server.connections = 0
+    workers = [threading.Thread(target=worker) for _dummy in xrange(threads)]
+    with bench_support.Timer() as timer:
+        for wkr in workers:
+            wkr.start()
+        for wkr in workers:
+            wkr.join()
+    return "time=%.2fs requests=%d connections=%d" % (
+        timer.elapsed, server.requests, server.connections)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    host_limit = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    from mna.lib import websupport
+    websupport.configure(host_limit)
+    server = bench_support.MockHttpServer(
+        lambda path: (200, {'Content-Type': 'application/rss+xml'},
+                      bench_support.rss_feed(path.replace('/', '_'))),
+        0.01).start()
+    try:
+        urls = ["%s/feed/%d" % (server.url, idx) for idx in xrange(count)]
+        rows = [("new connection", _run(server, _download_new_connection,
+                                        urls, threads)),
+                ("shared pool", _run(server, _download_pooled, urls,
+                                     threads))]
+        rows.append(("pool stats", repr(websupport.get_stats())))
+        bench_support.print_results(
+            "Downloading %d feeds from one host; %d threads, host limit %d"
+            % (count, threads, host_limit), rows)
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
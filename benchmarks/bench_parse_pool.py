@@ -0,0 +1,86 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" Benchmark - parsing corpus of large feeds by worker threads with and
+without process pool.
+
+Usage:
+    bench_parse_pool.py [number of feeds] [items per feed] [threads]
+
+Copyright (c) Karol Będkowski, 2015
+
+This file is part of mna
+Licence: GPLv2+
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2015"
+__version__ = "2015-06-13"
+
+import sys
+import threading
+import multiprocessing
+import Queue
+
+import bench_support
+
+
+def _parse_all(corpus, threads):
+    """ Parse all documents from `corpus` by `threads` threads. """
+    from mna.lib import procpool
+    from mna.lib import websupport
+    from mna.plugins.rss import feed
+
+    tasks = Queue.Queue()
+    for content in corpus:
+        tasks.put(content)
+    info = {'content-type': 'application/rss+xml'}
+
+    def worker():
+        while True:
+            try:
+                content = tasks.get(False)
+            except Queue.Empty:
+                return
+            doc = procpool.call(feed.parse_feed, content)
+            assert doc['entries']
+            parts = procpool.call(websupport.get_page_parts, info, content,
+                                  '//item')
+            assert parts
+
+    workers = [threading.Thread(target=worker) for _dummy in xrange(threads)]
+    with bench_support.Timer() as timer:
+        for wkr in workers:
+            wkr.start()
+        for wkr in workers:
+            wkr.join()
+    return timer.elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    items = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    from mna.lib import procpool
+
+    corpus = [bench_support.rss_feed("feed%d" % idx, items)
+              for idx in xrange(count)]
+    size = sum(len(content) for content in corpus)
+    rows = []
+    elapsed = _parse_all(corpus, threads)
+    rows.append(("threads", "time=%.2fs feeds/s=%.1f" % (elapsed,
+                                                         count / elapsed)))
+    processes = multiprocessing.cpu_count()
+    procpool.start(processes)
+    try:
+        elapsed = _parse_all(corpus, threads)
+    finally:
+        procpool.stop()
+    rows.append(("pool(%d)" % processes,
+                 "time=%.2fs feeds/s=%.1f" % (elapsed, count / elapsed)))
+    bench_support.print_results(
+        "Parsing %d feeds x %d items (%d kB), %d threads" %
+        (count, items, size / 1024, threads), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" Common functions for benchmarks.
+
+Copyright (c) Karol Będkowski, 2015
+
+This file is part of mna
+Licence: GPLv2+
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2015"
+__version__ = "2015-06-10"
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import BaseHTTPServer
+import SocketServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                '..')))
+
+
+def setup_env(debug=False):
+    """ Prepare configuration, temporary database and plugins.
+
+    Return:
+        path to temporary directory; should be removed by `cleanup_env`
+    """
+    from mna.lib.logging_setup import logging_setup
+    logging_setup("mna_bench.log", debug, False)
+
+    from mna.lib import appconfig
+    config = appconfig.AppConfig("mna_bench.cfg", "mna")
+    config.load_defaults(os.path.join(os.path.dirname(__file__), '..',
+                                      'data', 'defaults.cfg'))
+
+    tmpdir = tempfile.mkdtemp(prefix='mna_bench')
+    from mna.model import db
+    db.connect(os.path.join(tmpdir, 'mna.db'))
+
+    from mna.model import repo
+    repo.Reporitory().setup(tmpdir)
+
+    from mna import plugins
+    plugins.load_plugins()
+    return tmpdir
+
+
+def cleanup_env(tmpdir):
+    shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+class _ThreadingHTTPServer(SocketServer.ThreadingMixIn,
+                           BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    request_queue_size = 512
+
+
+class MockHttpServer(object):
+    """ Local http server serving `handler` responses in background thread.
+
+    Args:
+        handler: function(path) -> (status, headers dict, body)
+        delay: optional delay (in seconds) before each response
+    """
+
+    def __init__(self, handler, delay=0):
+        self.requests = 0
+        self.connections = 0
+        mock = self
+
+        class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+                mock.connections += 1
+
+            def do_GET(self):  # pylint:disable=invalid-name
+                mock.requests += 1
+                if delay:
+                    time.sleep(delay)
+                status, headers, body = handler(self.path)
+                self.send_response(status)
+                for key, val in headers.iteritems():
+                    self.send_header(key, val)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_args):
+                pass
+
+        self._server = _ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d' % self._server.server_address[1]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def rss_feed(title, items=20):
+    """ Generate simple rss feed with `items` entries. """
+    result = ['<?xml version="1.0" encoding="UTF-8"?>'
+              '<rss version="2.0"><channel>',
+              '<title>%s</title><link>http://localhost/</link>' % title]
+    for idx in xrange(items):
+        result.append(
+            '<item><title>%(t)s item %(i)d</title>'
+            '<link>http://localhost/%(t)s/%(i)d</link>'
+            '<guid>%(t)s-%(i)d</guid>'
+            '<description>Item %(i)d of %(t)s feed. Lorem ipsum dolor sit '
+            'amet, consectetur adipiscing elit.</description>'
+            '</item>' % {'t': title, 'i': idx})
+    result.append('</channel></rss>')
+    return "".join(result)
+
+
+def html_page(title, items=20):
+    """ Generate html page with `items` articles (div.item), scripts,
+    styles and comments. """
+    result = ['<html><head><title>%s</title>' % title,
+              '<style>.item { color: red; }</style>',
+              '<script>var x = 1;</script></head><body>',
+              '<h1>%s</h1><div id="content">' % title]
+    for idx in xrange(items):
+        result.append(
+            '<!-- item %(i)d --><div class="item"><h2>%(t)s item %(i)d</h2>'
+            '<p>Item %(i)d of %(t)s page. Lorem ipsum dolor sit amet, '
+            'consectetur adipiscing elit. <a href="/%(i)d">more</a></p>'
+            '<script>track(%(i)d);</script></div>' % {'t': title, 'i': idx})
+    result.append('</div></body></html>')
+    return "".join(result)
+
+
+class Timer(object):
+    """ Context manager measuring elapsed time. """
+
+    def __init__(self):
+        self.start = self.elapsed = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *_args):
+        self.elapsed = time.time() - self.start
+
+
+def print_results(title, rows):
+    """ Print `rows` (list of (label, value)) as simple table. """
+    print title
+    print '-' * len(title)
+    width = max(len(row[0]) for row in rows)
+    for label, value in rows:
+        print '%-*s  %s' % (width, label, value)
+    print
@@ -0,0 +1,106 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" Benchmark - parsing pages and extracting parts for WebSource modes:
+new parser per call & xpath string vs reused parser & compiled xpath.
+
+Usage:
+    bench_web_extract.py [repeat] [xpath selector] [directory with pages]
+
+Without directory pages are generated.
+
+Copyright (c) Karol Będkowski, 2015
+
+This file is part of mna
+Licence: GPLv2+
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2015"
+__version__ = "2015-06-17"
+
+import os
+import sys
+import itertools
+
+import bench_support
+
+
+def _get_page_parts_old(info, page, selector=None):
+    """ Previous implementation of websupport.get_page_parts. """
+    from lxml import etree
+    # pylint: disable=no-member
+    content_type = info.get('content-type')
+    if content_type and content_type.startswith('text/html'):
+        parser = etree.HTMLParser(encoding='UTF-8', remove_blank_text=True,
+                                  remove_comments=True, remove_pis=True)
+    else:
+        parser = etree.XMLParser(recover=True, encoding='UTF-8')
+    tree = etree.fromstring(page, parser)
+    for elem in itertools.chain(tree.xpath("//comment()"),
+                                tree.xpath("//script"),
+                                tree.xpath("//style")):
+        elem.getparent().remove(elem)
+    if not selector:
+        return [unicode(
+            etree.tostring(tree, encoding='utf-8', method='html').strip(),
+            encoding='utf-8', errors="replace")]
+    return [unicode(
+        etree.tostring(elem, encoding='utf-8', method='html').strip(),
+        encoding='utf-8', errors="replace")
+            for elem in tree.xpath(selector)]
+
+
+def _extract_old(info, page, mode, selector):
+    """ Extract articles like previous WebSource._get_articles. """
+    if mode == 'page':
+        return _get_page_parts_old(info, page, None)
+    parts = _get_page_parts_old(info, page, selector)
+    return parts[:1] if mode == 'page_one_part' else parts
+
+
+def _extract_new(info, page, mode, selector):
+    from mna.lib import websupport
+    return websupport.get_page_articles(
+        info, page, None if mode == 'page' else selector, False,
+        mode == 'page_one_part')['parts']
+
+
+def _extract(func, pages, mode, selector, repeat):
+    """ Extract articles by `func` in `mode`; return time per page (ms). """
+    info = {'content-type': 'text/html'}
+    with bench_support.Timer() as timer:
+        for _dummy in xrange(repeat):
+            for page in pages:
+                assert func(info, page, mode, selector)
+    return timer.elapsed * 1000.0 / (repeat * len(pages))
+
+
+def _load_pages(directory):
+    pages = []
+    for fname in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, fname), 'rb') as ifile:
+            pages.append(ifile.read())
+    return pages
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    selector = sys.argv[2] if len(sys.argv) > 2 else '//div[@class="item"]'
+    if len(sys.argv) > 3:
+        pages = _load_pages(sys.argv[3])
+    else:
+        pages = [bench_support.html_page("page%d" % idx, 50 * (idx + 1))
+                 for idx in xrange(10)]
+    rows = []
+    for mode in ('page', 'part', 'page_one_part'):
+        old = _extract(_extract_old, pages, mode, selector, repeat)
+        new = _extract(_extract_new, pages, mode, selector, repeat)
+        rows.append((mode, "old=%.2fms new=%.2fms per page" % (old, new)))
+    bench_support.print_results(
+        "Parse & extract %d pages (%d kB), selector %r" %
+        (len(pages), sum(len(page) for page in pages) / 1024, selector),
+        rows)
+
+
+if __name__ == '__main__':
+    main()
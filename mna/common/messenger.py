@@ -27,6 +27,8 @@ ST_UPDATE_SOURCE_FINISHED = 4
 class _Messenger(QtCore.QObject):
 
     source_updated = QtCore.pyqtSignal(int, int, name="updateSource")
+    sources_updated = QtCore.pyqtSignal(object, name="updateSources")
+    sources_status = QtCore.pyqtSignal(object, name="sourcesStatus")
     group_updated = QtCore.pyqtSignal(int, name="updateGroup")
     announce = QtCore.pyqtSignal(unicode, name="announce")
     updating_status = QtCore.pyqtSignal(int, int,
@@ -41,6 +43,22 @@ class _Messenger(QtCore.QObject):
         """
         self.source_updated.emit(source_id, group_id)
 
+    def emit_sources_updated(self, sources):
+        """ Send many sources updated message.
+
+        Args:
+            sources (list): list of (source id, group id) of updated sources
+        """
+        self.sources_updated.emit(sources)
+
+    def emit_sources_status(self, statuses):
+        """ Send sources status changed message.
+
+        Args:
+            statuses (dict): source id -> new status
+        """
+        self.sources_status.emit(statuses)
+
     def emit_group_updated(self, group_id):
         """ Send group of sources updated message.
 
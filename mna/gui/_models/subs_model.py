@@ -241,6 +241,35 @@ class TreeModel(QtCore.QAbstractItemModel):  # pylint:disable=no-member
         self.update_specials(session)
         self.layoutChanged.emit()  # pylint:disable=no-member
 
+    def update_sources(self, sources, session=None):
+        """ Update many sources (list of (source_id, group_id)) in one pass.
+        """
+        self.layoutAboutToBeChanged.emit()  # pylint:disable=no-member
+        groups = {}
+        for source_id, group_id in sources:
+            group = groups.get(group_id) or \
+                self.root.find_child_by_oid(group_id)
+            if group is None:
+                continue
+            groups[group_id] = group
+            source = group.find_child_by_oid(source_id)
+            if source is not None:
+                source.update(session)
+        for group in groups.itervalues():
+            group.update_unread()
+        self.update_specials(session)
+        self.layoutChanged.emit()  # pylint:disable=no-member
+
+    def set_sources_status(self, statuses):
+        """ Set status for many sources (dict source_id -> status). """
+        self.layoutAboutToBeChanged.emit()  # pylint:disable=no-member
+        for group in self.root.children:
+            for source in group.children:
+                status = statuses.get(source.oid)
+                if status:
+                    source.set_status(status)
+        self.layoutChanged.emit()  # pylint:disable=no-member
+
     def set_source_status(self, source_id, status):
         self.layoutAboutToBeChanged.emit()  # pylint:disable=no-member
 
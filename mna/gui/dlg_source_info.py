@@ -21,6 +21,7 @@ from mna.model import db
 from mna.model import dbobjects as DBO
 from mna import plugins
 from mna.lib import appconfig
+from mna.logic import timings
 
 _LOG = logging.getLogger(__name__)
 
@@ -50,13 +51,32 @@ class DlgSourceInfo(QtGui.QDialog):  # pylint:disable=too-few-public-methods,no-
 
     def _create_info_model(self, source, session, src_class):
         articles_cnt = db.count(DBO.Article, source_id=source.oid)
+        meta = source.meta or {}
         info = [('Name', source.name),
                 ('Title', source.title),
                 ('Last refreshed', unicode(source.last_refreshed)),
                 ('Next refresh', unicode(source.next_refresh)),
+                ('Refresh interval', unicode(meta.get('interval'))),
+                ('Interval reason', unicode(meta.get('interval_reason'))),
                 ('Last error date', unicode(source.last_error_date)),
                 ('Last error', unicode(source.last_error)),
+                ('Failures', unicode(source.failure_counter)),
                 ('Articles', unicode(articles_cnt))]
+        if source.failure_counter:
+            info.insert(4, ('Next attempt', u"%s (%s)" % (
+                source.next_refresh, meta.get('retry_reason'))))
+        for name, p50, p95 in timings.get_source_stats(source.oid, session):
+            if name == 'bytes':
+                info.append(('Downloaded bytes (p50/p95)',
+                             u"%d / %d" % (p50, p95)))
+            else:
+                info.append(('Time %s ms (p50/p95)' % name,
+                             u"%d / %d" % (p50, p95)))
+        revalidation = timings.get_source_revalidation(source.oid, session)
+        if revalidation:
+            info.append(('Responses modified/not modified/cached/'
+                         'unchanged (saved bytes)',
+                         u"%d / %d / %d / %d (~%d)" % revalidation))
         info.extend(src_class.get_info(source, session) or [])
 
         model = QtGui.QStandardItemModel(0, 2, self._ui.lv_info)  # pylint:disable=no-member
@@ -112,6 +112,8 @@ class WndMain(QtGui.QMainWindow):  # pylint: disable=no-member
         self._t_search.returnPressed.connect(self._on_search_return)
         # global events
         messenger.MESSENGER.source_updated.connect(self._on_source_updated)
+        messenger.MESSENGER.sources_updated.connect(self._on_sources_updated)
+        messenger.MESSENGER.sources_status.connect(self._on_sources_status)
         messenger.MESSENGER.group_updated.connect(self._on_group_updated)
         messenger.MESSENGER.announce.connect(self._on_announce)
         messenger.MESSENGER.updating_status.connect(self._on_updating_status)
@@ -292,11 +294,10 @@ class WndMain(QtGui.QMainWindow):  # pylint: disable=no-member
             [src[0] for src in sources_to_mark])
         # when updated - emit signals for refresh tree/list
         if updated > 0:
-            for source_oid, group_oid in sources_to_mark:
-                # send signals only for real updated sources
-                if src_updated[source_oid] > 0:
-                    messenger.MESSENGER.emit_source_updated(
-                        source_oid, group_oid)
+            # send signals only for real updated sources
+            messenger.MESSENGER.emit_sources_updated(
+                [(source_oid, group_oid) for source_oid, group_oid
+                 in sources_to_mark if src_updated[source_oid] > 0])
             messenger.MESSENGER.emit_group_updated(sources_to_mark[0][1])
         self._select_next_unread_source()
 
@@ -355,27 +356,43 @@ class WndMain(QtGui.QMainWindow):  # pylint: disable=no-member
     def _on_source_updated(self, source_id, group_id):
         """ Handle  source update event. """
         _LOG.debug("Source updated %r, %r", source_id, group_id)
-        if not source_id or not group_id:
+        self._on_sources_updated([(source_id, group_id)])
+
+    @QtCore.pyqtSlot(object)
+    def _on_sources_updated(self, sources):
+        """ Handle many sources update event (list of (source_id,
+        group_id)); article list is refreshed at most once. """
+        sources = [(source_id, group_id) for source_id, group_id in sources
+                   if source_id and group_id]
+        _LOG.debug("Sources updated %r", sources)
+        if not sources:
             return
-        self._subs_model.update_source(source_id, group_id)
+        self._subs_model.update_sources(sources)
         # refresh article list when updated source is displayed
         model = self._arts_list_model
         if ((model.ds_kind == arts_model.DS_SOURCE and
-             model.ds_oid == source_id) or
+             model.ds_oid in set(src[0] for src in sources)) or
                 (model.ds_kind == arts_model.DS_GROUP and
-                 model.ds_oid == group_id)):
-            sel_art = self._selected_article
-            if not sel_art:
-                self._arts_list_model.refresh()
-                return
-            # try to keep current selection
-            sel_art_oid = sel_art.oid
+                 model.ds_oid in set(src[1] for src in sources))):
+            self._refresh_articles_list()
+
+    def _refresh_articles_list(self):
+        """ Refresh article list; try to keep current selection. """
+        sel_art = self._selected_article
+        if not sel_art:
             self._arts_list_model.refresh()
-            index = self._arts_list_model.get_index_by_oid(sel_art_oid)
-            if index:
-                self._ui.tv_articles.selectionModel().setCurrentIndex(
-                    index, QtGui.QItemSelectionModel.ClearAndSelect
-                    | QtGui.QItemSelectionModel.Rows)
+            return
+        sel_art_oid = sel_art.oid
+        self._arts_list_model.refresh()
+        index = self._arts_list_model.get_index_by_oid(sel_art_oid)
+        if index:
+            self._ui.tv_articles.selectionModel().setCurrentIndex(
+                index, QtGui.QItemSelectionModel.ClearAndSelect
+                | QtGui.QItemSelectionModel.Rows)
+
+    @QtCore.pyqtSlot(object)
+    def _on_sources_status(self, statuses):
+        self._subs_model.set_sources_status(statuses)
 
     @QtCore.pyqtSlot(unicode)
     def _on_announce(self, message):
@@ -412,7 +429,8 @@ class WndMain(QtGui.QMainWindow):  # pylint: disable=no-member
         elif status == messenger.ST_UPDATE_SOURCE_FINISHED:
             self._subs_model.set_source_status(data, 'update_finished')
         else:
-            self._progress_bar_cntr += self._progress_bar_step
+            # data - number of finished sources
+            self._progress_bar_cntr += self._progress_bar_step * (data or 1)
             _LOG.debug("_on_updating_status: %r", self._progress_bar_cntr)
             pbar.setValue(self._progress_bar_cntr)
 
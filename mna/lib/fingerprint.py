@@ -0,0 +1,96 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Approximate similarity of texts by MinHash (bottom-k) signatures.
+
+Signature of text is list of `SKETCH_SIZE` smallest hashes of its word
+shingles; similarity of two signatures estimate Jaccard index of shingles
+sets. It is cheap to compute (linear) and small enough to keep in article
+meta, so previous article content is not needed for comparison.
+
+Jaccard index is lower than difflib ratio (2 * matches / total length, like
+Dice coefficient) for the same texts, so `compare` converts it to Dice
+coefficient of shingles before checking it against threshold configured
+for difflib ratio.
+
+Copyright (c) Karol Będkowski, 2015
+
+This file is part of mna
+Licence: GPLv2+
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2015"
+__version__ = "2015-06-17"
+
+import re
+import zlib
+import heapq
+import difflib
+import logging
+
+_LOG = logging.getLogger(__name__)
+
+# key in article meta for signature
+META_KEY = 'minhash'
+# number of hashes in signature
+SKETCH_SIZE = 64
+# number of words in shingle
+SHINGLE_SIZE = 3
+# default distance from threshold in which exact (difflib) ratio is computed
+EXACT_MARGIN = 0.05
+
+_TAGS_RE = re.compile(r'<[^>]*>')
+_WORDS_RE = re.compile(r'\w+', re.U)
+
+
+def signature(text, size=SKETCH_SIZE):
+    """ Compute signature of `text` (html tags are ignored). """
+    words = _WORDS_RE.findall(_TAGS_RE.sub(' ', text or '').lower())
+    if len(words) >= SHINGLE_SIZE:
+        shingles = set(u" ".join(words[idx:idx + SHINGLE_SIZE])
+                       for idx in xrange(len(words) - SHINGLE_SIZE + 1))
+    else:
+        shingles = set(words)
+    hashes = set(zlib.crc32(shingle.encode('utf-8')) & 0xffffffff
+                 for shingle in shingles)
+    return heapq.nsmallest(size, hashes)
+
+
+def similarity(sig1, sig2, size=SKETCH_SIZE):
+    """ Estimate similarity (0-1) of texts by its signatures. """
+    if not sig1 or not sig2:
+        return 1.0 if not sig1 and not sig2 else 0.0
+    set1, set2 = set(sig1), set(sig2)
+    union = heapq.nsmallest(size, set1 | set2)
+    both = sum(1 for val in union if val in set1 and val in set2)
+    return float(both) / len(union)
+
+
+def _jaccard2ratio(jaccard):
+    """ Convert Jaccard index to Dice coefficient - estimate of difflib
+    ratio. Edits scattered over text change up to `SHINGLE_SIZE` shingles
+    per word, so for them estimate is still lower than ratio; exact ratio
+    is computed near threshold. """
+    return 2.0 * jaccard / (1.0 + jaccard)
+
+
+def compare(content, sig, last, threshold, exact_margin=EXACT_MARGIN):
+    """ Compute similarity of `content` with signature `sig` to `last`
+    article.
+
+    Signature of `last` is taken from its meta; content of `last` is loaded
+    only for old articles without signature or when estimated similarity
+    is within `exact_margin` from `threshold` - then exact ratio is
+    computed by difflib.
+
+    Estimate is calibrated to difflib ratio scale (see `_jaccard2ratio`).
+    """
+    last_sig = (last.meta or {}).get(META_KEY)
+    if last_sig is None:
+        last_sig = signature(last.content)
+    result = _jaccard2ratio(similarity(sig, last_sig))
+    if exact_margin and abs(result - threshold) <= exact_margin:
+        result = difflib.SequenceMatcher(None, last.content, content).ratio()
+        _LOG.debug("compare: exact similarity %r", result)
+    return result
@@ -0,0 +1,78 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Optional pool of processes for CPU-bound work (parsing feeds & pages).
+
+Functions called by `call` must be module-level functions; arguments and
+results must be picklable (plain dicts, lists, strings).
+
+Copyright (c) Karol Będkowski, 2015
+
+This file is part of mna
+Licence: GPLv2+
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2015"
+__version__ = "2015-06-13"
+
+import signal
+import logging
+import threading
+import multiprocessing
+
+_LOG = logging.getLogger(__name__)
+_POOL = None
+_LOCK = threading.Lock()
+
+
+def _init_process():
+    # interrupts are handled by main process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def start(processes):
+    """ Start pool with `processes` processes; 0 - disabled (run all work
+    in calling thread); -1 - one process per cpu. """
+    global _POOL  # pylint: disable=global-statement
+    if processes < 0:
+        processes = multiprocessing.cpu_count()
+    with _LOCK:
+        if _POOL is not None or not processes:
+            return
+        _LOG.info("procpool.start: processes=%d", processes)
+        _POOL = multiprocessing.Pool(processes, _init_process)
+
+
+def stop(timeout=None):
+    """ Stop pool (if started); wait up to `timeout` seconds (None - no
+    limit) for running tasks, then terminate processes. """
+    global _POOL  # pylint: disable=global-statement
+    with _LOCK:
+        pool, _POOL = _POOL, None
+    if pool is None:
+        return
+    _LOG.info("procpool.stop")
+    pool.close()
+    # Pool.join can't be interrupted; wait for it in separate thread
+    joiner = threading.Thread(target=pool.join)
+    joiner.daemon = True
+    joiner.start()
+    joiner.join(timeout)
+    if joiner.is_alive():
+        _LOG.warn("procpool.stop: timeout; terminating processes")
+        pool.terminate()
+        joiner.join(1)
+
+
+def is_enabled():
+    return _POOL is not None
+
+
+def call(func, *args):
+    """ Call `func(*args)` in pool process when pool is started; otherwise
+    in current thread. Exceptions are reraised in caller. """
+    pool = _POOL
+    if pool is None:
+        return func(*args)
+    return pool.apply(func, args)
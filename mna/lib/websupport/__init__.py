@@ -7,25 +7,86 @@ __author__ = "Karol Będkowski"
 __copyright__ = "Copyright (c) Karol Będkowski, 2014-2015"
 __version__ = "2015-01-18"
 
+import re
+import io
+import time
 import logging
-import itertools
 import urllib2
 import os.path
+import threading
+import itertools
 
 from lxml import etree
 
 from .errors import LoadPageError
+from ._common import parse_retry_after, reset_downloaded, reset_statuses, \
+    reset_download_time, get_header
+from . import _cache
+from . import _common
+from . import _parallel
+from ._cache import configure as configure_cache
 
 _LOG = logging.getLogger(__name__)
 
 try:
-    from ._requests import download_page
+    from ._requests import download_page as _download_page, configure, \
+        get_stats as _get_stats
     _LOG.info('websupport using python-requests')
 except ImportError:
-    from ._raw import download_page
+    from ._raw import download_page as _download_page, configure, \
+        get_stats as _get_stats
     _LOG.info('websupport using urllib2')
 
 
+def download_page(url, etag=None, modified=None, max_size=None,
+                  validators=None):
+    """ Download page from `url` using shared cache (when enabled by
+    `configure_cache`).
+
+    Args & Return: see `_requests.download_page`; cached pages have
+        `_cached` header.
+        validators (dict): optional store url -> [etag, last-modified]
+            (raw headers); when given validators for `url` are loaded from
+            and saved in it; `etag` and `modified` are used only when store
+            has no entry for `url`
+    """
+    if validators is not None and validators.get(url):
+        etag, modified = validators[url]
+    start = time.time()
+    try:
+        info, content = _cache.download(_download_page, url, etag, modified,
+                                        max_size)
+    finally:
+        _common.add_download_time(time.time() - start)
+    _common.add_status(info['_status'], info.get('_cached'))
+    if validators is not None and content is not None:
+        etag = get_header(info, 'etag')
+        modified = get_header(info, 'last-modified')
+        if etag or modified:
+            validators[url] = [etag, modified]
+        else:
+            validators.pop(url, None)
+    return info, content
+
+
+def download_pages(urls, concurrency=_parallel.CONCURRENCY, timeout=None):
+    """ Download pages from `urls` concurrently (see
+    `_parallel.download_pages`).
+
+    Return:
+        iterator of (url, content, error) in order of `urls`
+    """
+    return _parallel.download_pages(download_page, urls, concurrency,
+                                    timeout)
+
+
+def get_stats():
+    """ Get connections pool and cache statistics. """
+    stats = _get_stats()
+    stats.update(_cache.get_stats())
+    return stats
+
+
 def _parse_html_content(content, encoding=None):
     # pylint: disable=no-member
     if isinstance(content, (str, unicode)):
@@ -41,7 +102,78 @@ def _parse_html_content(content, encoding=None):
     return tree
 
 
-def get_page_part(info, page, selector=None):
+# parsers and compiled xpath expressions are not thread-safe; each thread
+# has own instances
+_LOCAL = threading.local()
+# max number of compiled xpath expressions kept by one thread
+_XPATH_CACHE_SIZE = 100
+
+
+def _get_parser(html):
+    """ Get HTML or XML parser for current thread. """
+    parsers = getattr(_LOCAL, 'parsers', None)
+    if parsers is None:
+        # pylint: disable=no-member
+        parsers = _LOCAL.parsers = {
+            True: etree.HTMLParser(encoding='UTF-8', remove_blank_text=True,
+                                   remove_comments=True, remove_pis=True),
+            False: etree.XMLParser(recover=True, encoding='UTF-8')}
+    return parsers[html]
+
+
+def get_xpath(selector):
+    """ Get compiled xpath `selector` from current thread cache. """
+    cache = getattr(_LOCAL, 'xpaths', None)
+    if cache is None:
+        cache = _LOCAL.xpaths = {}
+    xpath = cache.get(selector)
+    if xpath is None:
+        if len(cache) >= _XPATH_CACHE_SIZE:
+            cache.clear()
+        xpath = cache[selector] = etree.XPath(  # pylint: disable=no-member
+            selector)
+    return xpath
+
+
+def _clean_tree(tree):
+    """ Remove comments, scripts and styles from `tree` in one pass. """
+    # pylint: disable=no-member
+    for elem in list(tree.iter(etree.Comment, 'script', 'style')):
+        parent = elem.getparent()
+        if parent is not None:
+            parent.remove(elem)
+
+
+def _is_html(info):
+    content_type = info.get('content-type')
+    return bool(content_type and content_type.startswith('text/html'))
+
+
+def _parse_page(info, page, html=None):
+    """ Parse `page` by parser selected by content type (or by `html` flag
+    when given); remove comments, scripts and styles. """
+    parser = _get_parser(_is_html(info) if html is None else html)
+    tree = etree.fromstring(page, parser)  # pylint: disable=no-member
+    _clean_tree(tree)
+    return tree
+
+
+def _to_html(elem):
+    # pylint: disable=no-member
+    return unicode(
+        etree.tostring(elem, encoding='utf-8', method='html').strip(),
+        encoding='utf-8', errors="replace")
+
+
+def _iter_parts(tree, selector):
+    """ Yield (element, html) for elements of `tree` found by `selector`
+    or whole tree when no selector. """
+    elems = get_xpath(selector)(tree) if selector else [tree]
+    for elem in elems:
+        yield elem, _to_html(elem)
+
+
+def get_page_part(info, page, selector=None, with_elements=False):
     """ Find all elements of `page` by `selector` xpath expression.
     If empty selector - return parsed whole page.
 
@@ -49,45 +181,118 @@ def get_page_part(info, page, selector=None):
         info (dict): page heades
         page (str): downloaded page content
         selector (str): optional xpath selector
+        with_elements (bool): yield (element, html) instead of html
     """
-    content_type = info.get('content-type')
-    if content_type and content_type.startswith('text/html'):
-        # pylint: disable=no-member
-        parser = etree.HTMLParser(encoding='UTF-8', remove_blank_text=True,
-                                  remove_comments=True, remove_pis=True)
-    else:
-        parser = etree.XMLParser(  # pylint:disable=no-member
-            recover=True, encoding='UTF-8')
-    tree = etree.fromstring(page, parser)  # pylint: disable=no-member
-    for elem in itertools.chain(tree.xpath("//comment()"),
-                                tree.xpath("//script"),
-                                tree.xpath("//style")):
-        elem.getparent().remove(elem)
-    if not selector:
-        # pylint: disable=no-member
-        return [unicode(
-            etree.tostring(tree, encoding='utf-8', method='html').strip(),
-            encoding='utf-8', errors="replace")]
+    parts = _iter_parts(_parse_page(info, page), selector)
+    if with_elements:
+        return parts
+    return (html for _elem, html in parts)
+
+
+def get_page_parts(info, page, selector=None):
+    """ Like `get_page_part` but return list; may be called by `procpool`.
+    """
+    return list(get_page_part(info, page, selector))
+
+
+# selectors that can be evaluated during parsing: //tag or //tag[@attr="val"]
+# (attributes with namespace prefix are not supported)
+_SIMPLE_SELECTOR_RE = re.compile(
+    r"""^//(\*|[A-Za-z][\w.-]*)(?:\[@([\w.-]+)=(["'])(.*?)\3\])?$""")
+
+
+def _find_first_incremental(info, page, selector):
+    """ Find first element matching simple `selector` by incremental
+    parsing; stop reading page when element (with its tail) is found.
+
+    Return:
+        [(element, html)] when found, [] when page not contain such element,
+        None when `selector` is not simple or page can't be parsed.
+    """
+    match = _SIMPLE_SELECTOR_RE.match(selector.strip())
+    if not match:
+        return None
+    tag, attr, _quote, value = match.groups()
+    html = _is_html(info)
+    if html:
+        tag = tag.lower()
     # pylint: disable=no-member
-    return (unicode(
-        etree.tostring(elem, encoding='utf-8', method='html').strip(),
-        encoding='utf-8', errors="replace")
-            for elem in tree.xpath(selector))
+    events = etree.iterparse(
+        io.BytesIO(page), events=('start', 'end'), html=html, recover=True,
+        encoding='UTF-8', remove_blank_text=html, remove_comments=html,
+        remove_pis=html)
+    target = None
+    target_closed = False
+    try:
+        for event, elem in events:
+            if target_closed:
+                # any next event means that tail of target is parsed
+                break
+            if target is None:
+                # first element in document order is selected on its start
+                if event == 'start' and (tag == '*' or elem.tag == tag) \
+                        and (not attr or elem.get(attr) == value):
+                    target = elem
+                continue
+            if event == 'end' and elem is target:
+                target_closed = True
+    except etree.LxmlError, err:
+        _LOG.debug("_find_first_incremental: %r error %s", selector, err)
+        return None
+    if not target_closed:
+        return []
+    _clean_tree(target)
+    return [(target, _to_html(target))]
 
 
-def get_title(page_content, encoding=None):
-    """ Find title in html page or part.
+def get_page_articles(info, page, selector=None, with_page_info=False,
+                      first_only=False):
+    """ Parse `page` once and find parts by `selector` (or whole page) with
+    its titles; may be called by `procpool`.
 
     Args:
-        page_content (str|etree.Element): page to process
-        encoding (str): optional page encoding
+        info (dict): page heades
+        page (str): downloaded page content
+        selector (str): optional xpath selector
+        with_page_info (bool): find also page title and icons
+        first_only (bool): find only first part; for simple selectors
+            (//tag, //tag[@attr="value"]) page is parsed only to this part
 
     Return:
-        title if founded
+        dict: parts - list of (part html, part title); when
+        `with_page_info`: title - page title, icons - list of icons href
+        (see `download_icon`)
     """
-    tree = _parse_html_content(page_content, encoding)
-    for tag in ('//head/title', '//h1', '//h2'):
-        titles = tree.xpath(tag)
+    if first_only and selector and not with_page_info:
+        found = _find_first_incremental(info, page, selector)
+        if found is not None:
+            return {'parts': [(html, _find_title(elem))
+                              for elem, html in found]}
+    tree = _parse_page(info, page)
+    parts = _iter_parts(tree, selector)
+    if first_only:
+        parts = itertools.islice(parts, 1)
+    result = {'parts': [(html, _find_title(elem)) for elem, html in parts]}
+    if with_page_info:
+        # title and icons are searched by html xpaths (may not match tree
+        # created by xml parser, i.e. for xhtml)
+        if not _is_html(info):
+            tree = _parse_page(info, page, html=True)
+        result['title'] = _find_title(tree)
+        result['icons'] = _find_icons(tree)
+    return result
+
+
+# xpath searching title in page or its part (element)
+_TITLE_XPATH = ('descendant-or-self::head/title',
+                'descendant-or-self::h1',
+                'descendant-or-self::h2')
+
+
+def _find_title(tree):
+    """ Find title in parsed page or part. """
+    for tag in _TITLE_XPATH:
+        titles = get_xpath(tag)(tree)
         if titles:
             title = titles[0].text
             if title:
@@ -105,41 +310,56 @@ def get_title(page_content, encoding=None):
     return title
 
 
+def get_title(page_content, encoding=None):
+    """ Find title in html page or part.
+
+    Args:
+        page_content (str|etree.Element): page to process
+        encoding (str): optional page encoding
+
+    Return:
+        title if founded
+    """
+    return _find_title(_parse_html_content(page_content, encoding))
+
+
 _ICONS_XPATH = ['/html/head/link[@rel="icon"]',
                 '/html/head/link[@rel="shortcut icon"]',
                 '/html/head/link[@rel="apple-touch-icon-precomposed"]']
 
 
-def get_icon(base_url, page_content, encoding):
-    """ Find icon for page and download it.
+def _find_icons(tree):
+    """ Find href of icons declared in parsed page. """
+    hrefs = []
+    for xpath in _ICONS_XPATH:
+        icon = get_xpath(xpath)(tree)
+        if icon:
+            _LOG.debug('_find_icons %r %r', xpath, icon[0].attrib)
+            icon_href = icon[0].attrib.get('href')
+            if icon_href:
+                hrefs.append(icon_href)
+    return hrefs
+
+
+def download_icon(base_url, hrefs):
+    """ Download first available icon from `hrefs` or /favicon.ico.
 
     Args:
         base_url (str): web page original url
-        page_content (str|etree.Element): page content
-        encoding (str): page encoding
+        hrefs (list): icons href found in page
     Return:
         (icon content, icon name)
     """
-    _LOG.info('get_icon for %r', base_url)
-    # pylint: disable=no-member
-    tree = _parse_html_content(page_content, encoding)
-    for xpath in _ICONS_XPATH:
-        icon = tree.xpath(xpath)
-        if icon:
-            _LOG.info('get_icon %r %r %r %r', base_url, xpath, icon,
-                      icon[0].attrib)
-            icon_href = icon[0].attrib.get('href')
-            if not icon_href:
-                continue
-            url = urllib2.urlparse.urljoin(base_url, icon_href)
-            _LOG.debug("get_icon: found icon url=%r", url)
-            try:
-                _info, icon = download_page(url, None, None)
-                if icon:
-                    _LOG.debug("get_icon: downloaded icon url=%r", url)
-                    return icon, os.path.basename(url)
-            except LoadPageError, err:
-                _LOG.debug('get_icon: %r error %s', url, err)
+    for icon_href in hrefs:
+        url = urllib2.urlparse.urljoin(base_url, icon_href)
+        _LOG.debug("get_icon: found icon url=%r", url)
+        try:
+            _info, icon = download_page(url, None, None)
+            if icon:
+                _LOG.debug("get_icon: downloaded icon url=%r", url)
+                return icon, os.path.basename(url)
+        except LoadPageError, err:
+            _LOG.debug('get_icon: %r error %s', url, err)
     # try to load /favicon.ico
     url = urllib2.urlparse.urljoin(base_url, '/favicon.ico')
     try:
@@ -151,3 +371,18 @@ def get_icon(base_url, page_content, encoding):
         _LOG.debug('get_icon: %r error %s', url, err)
     _LOG.info('get_icon: %r not found', url)
     return None, None
+
+
+def get_icon(base_url, page_content, encoding):
+    """ Find icon for page and download it.
+
+    Args:
+        base_url (str): web page original url
+        page_content (str|etree.Element): page content
+        encoding (str): page encoding
+    Return:
+        (icon content, icon name)
+    """
+    _LOG.info('get_icon for %r', base_url)
+    tree = _parse_html_content(page_content, encoding)
+    return download_icon(base_url, _find_icons(tree))
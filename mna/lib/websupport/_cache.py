@@ -0,0 +1,373 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" Web support functions - on-disk cache of downloaded pages shared by all
+sources.
+
+Copyright (c) Karol Będkowski, 2015
+
+This file is part of mna
+Licence: GPLv2+
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2015"
+__version__ = "2015-06-15"
+
+import os
+import time
+import hashlib
+import logging
+import threading
+import contextlib
+import cPickle
+
+from ._common import get_header, check_size
+
+_LOG = logging.getLogger(__name__)
+
+# default max size (bytes) of all cached pages
+MAX_SIZE = 50 * 1024 * 1024
+# default time (sec) in which cached page is used without revalidation
+FRESH_TIME = 60
+
+_ENTRY_EXT = '.entry'
+_TMP_EXT = '.tmp'
+# request headers that may be listed in Vary - the same in all requests
+_VARY_SAFE = ('accept-encoding', 'user-agent')
+
+# global cache; None = disabled
+_CACHE = None
+
+
+def _get_max_age(info):
+    """ Get max-age from Cache-Control header; 0 when page can't be used
+    without revalidation. """
+    cache_control = get_header(info, 'cache-control')
+    if not cache_control:
+        return None
+    for directive in cache_control.lower().split(','):
+        directive = directive.strip()
+        if directive in ('no-cache', 'must-revalidate'):
+            return 0
+        if directive.startswith('max-age='):
+            try:
+                return max(int(directive[8:]), 0)
+            except ValueError:
+                return None
+    return None
+
+
+def _is_storable(info):
+    cache_control = get_header(info, 'cache-control') or ''
+    if 'no-store' in cache_control.lower():
+        return False
+    # response may depend on request headers (i.e. cookies) that differ
+    # between requests
+    vary = get_header(info, 'vary')
+    if vary:
+        return all(header.strip().lower() in _VARY_SAFE
+                   for header in vary.split(','))
+    return True
+
+
+class _Entry(object):
+    """ Cached page. """
+
+    def __init__(self, info, content, stored, lifetime):
+        self.info = info
+        self.content = content
+        self.stored = stored
+        self.lifetime = lifetime
+
+    @property
+    def etag(self):
+        return get_header(self.info, 'etag')
+
+    @property
+    def modified(self):
+        return get_header(self.info, 'last-modified')
+
+    def is_fresh(self):
+        return time.time() - self.stored < self.lifetime
+
+    def has_validators(self):
+        return bool(self.etag or self.modified)
+
+    def response(self, etag, modified):
+        """ Create response for caller with given validators: "not modified"
+        when caller already has this version of page. """
+        info = dict(self.info)
+        info['_cached'] = True
+        info['_wire_size'] = 0
+        if etag:
+            not_modified = etag == self.etag
+        else:
+            not_modified = bool(modified) and \
+                modified in (self.modified, self.info.get('_modified'))
+        if not_modified:
+            info['_status'] = 304
+            return info, None
+        info['_status'] = 200
+        return info, self.content
+
+
+class HttpCache(object):
+    """ Pages cached on disk in `directory`, keyed by url and validators
+    (etag, last-modified) of cached version; only last version of page is
+    kept.
+
+    Pages are used without request for `fresh_time` seconds (or less when
+    server send Cache-Control max-age); later are revalidated by
+    conditional request. Least recently used pages are removed when size of
+    cache exceed `max_size`.
+    """
+
+    def __init__(self, directory, max_size=MAX_SIZE, fresh_time=FRESH_TIME):
+        self._dir = directory
+        self._max_size = max_size
+        self._fresh_time = fresh_time
+        self._lock = threading.Lock()
+        # entry key -> [last access time, size]
+        self._index = {}
+        # url key -> entry key of current version
+        self._current = {}
+        self._size = 0
+        # key -> [lock, number of users]
+        self._url_locks = {}
+        self._stats = {'hits': 0, 'revalidated': 0, 'misses': 0}
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._load_index()
+
+    def _load_index(self):
+        for fname in os.listdir(self._dir):
+            path = os.path.join(self._dir, fname)
+            if fname.endswith(_TMP_EXT):
+                # left by interrupted write
+                _unlink(path)
+                continue
+            if not fname.endswith(_ENTRY_EXT):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            key = fname[:-len(_ENTRY_EXT)]
+            url_key = _url_key_of(key)
+            current = self._current.get(url_key)
+            if current is not None:
+                # keep only newest version of page
+                if self._index[current][0] >= stat.st_mtime:
+                    _unlink(path)
+                    continue
+                self._size -= self._index.pop(current)[1]
+                _unlink(self._path(current))
+            self._current[url_key] = key
+            self._index[key] = [stat.st_mtime, stat.st_size]
+            self._size += stat.st_size
+        _LOG.debug("HttpCache: %d entries, %d bytes", len(self._index),
+                   self._size)
+
+    def _path(self, key):
+        return os.path.join(self._dir, key + _ENTRY_EXT)
+
+    @contextlib.contextmanager
+    def lock_url(self, url):
+        """ Serialize requests for one url so concurrent sources wait for
+        first download instead of fetching page again. """
+        key = _url_key(url)
+        with self._lock:
+            lock_users = self._url_locks.get(key)
+            if lock_users is None:
+                lock_users = self._url_locks[key] = [threading.Lock(), 0]
+            lock_users[1] += 1
+        try:
+            with lock_users[0]:
+                yield
+        finally:
+            with self._lock:
+                lock_users[1] -= 1
+                if not lock_users[1]:
+                    del self._url_locks[key]
+
+    def count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, url):
+        """ Load entry for `url`; return None when not found. """
+        with self._lock:
+            key = self._current.get(_url_key(url))
+            if key is None:
+                return None
+            self._index[key][0] = time.time()
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as ifile:
+                data = cPickle.load(ifile)
+            os.utime(path, None)
+        except (IOError, OSError, EOFError, cPickle.UnpicklingError), err:
+            _LOG.warn("HttpCache: error loading %s: %s", path, err)
+            self._remove(key)
+            return None
+        if data['url'] != url:
+            return None
+        return _Entry(data['info'], data['content'], data['stored'],
+                      data['lifetime'])
+
+    def put(self, url, info, content):
+        """ Store page in cache. """
+        if not _is_storable(info) or len(content) > self._max_size:
+            return
+        max_age = _get_max_age(info)
+        lifetime = self._fresh_time if max_age is None else \
+            min(max_age, self._fresh_time)
+        self._write(url, _Entry(info, content, time.time(), lifetime))
+
+    def refresh(self, url, entry):
+        """ Mark `entry` as fresh after successful revalidation. """
+        entry.stored = time.time()
+        self._write(url, entry)
+
+    def _write(self, url, entry):
+        url_key = _url_key(url)
+        key = _entry_key(url_key, entry.etag, entry.modified)
+        path = self._path(key)
+        tmp_path = "%s.%d%s" % (path, threading.current_thread().ident,
+                                _TMP_EXT)
+        data = {'url': url, 'info': entry.info, 'content': entry.content,
+                'stored': entry.stored, 'lifetime': entry.lifetime}
+        try:
+            with open(tmp_path, 'wb') as ofile:
+                cPickle.dump(data, ofile, cPickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_path, path)
+            size = os.path.getsize(path)
+        except (IOError, OSError, cPickle.PicklingError), err:
+            _LOG.warn("HttpCache: error writing %s: %s", path, err)
+            _unlink(tmp_path)
+            return
+        with self._lock:
+            old = self._index.get(key)
+            if old:
+                self._size -= old[1]
+            self._index[key] = [time.time(), size]
+            self._size += size
+            prev_key = self._current.get(url_key)
+            self._current[url_key] = key
+            to_remove = self._find_lru()
+        if prev_key is not None and prev_key != key:
+            # previous version of page
+            self._remove(prev_key)
+        for old_key in to_remove:
+            self._remove(old_key)
+
+    def _find_lru(self):
+        """ Remove from index least recently used entries when cache is too
+        big; return keys of removed entries. Must be called with lock. """
+        if self._size <= self._max_size:
+            return []
+        removed = []
+        for key, (_atime, size) in sorted(self._index.iteritems(),
+                                          key=lambda item: item[1][0]):
+            if self._size <= self._max_size:
+                break
+            del self._index[key]
+            self._size -= size
+            removed.append(key)
+        return removed
+
+    def _remove(self, key):
+        with self._lock:
+            entry = self._index.pop(key, None)
+            if entry:
+                self._size -= entry[1]
+            url_key = _url_key_of(key)
+            if self._current.get(url_key) == key:
+                del self._current[url_key]
+        _unlink(self._path(key))
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(('cache_' + key, val)
+                         for key, val in self._stats.iteritems())
+            stats['cache_entries'] = len(self._index)
+            stats['cache_size'] = self._size
+        return stats
+
+
+def _url_key(url):
+    return hashlib.sha1(url.encode('utf-8') if isinstance(url, unicode)
+                        else url).hexdigest()
+
+
+def _entry_key(url_key, etag, modified):
+    """ Key of entry: url key and hash of validators. """
+    validators = "%s\n%s" % (etag or '', modified or '')
+    return url_key + '-' + hashlib.sha1(validators).hexdigest()[:16]
+
+
+def _url_key_of(key):
+    return key.split('-', 1)[0]
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def configure(directory, max_size=MAX_SIZE, fresh_time=FRESH_TIME):
+    """ Enable cache in `directory`; disable when `directory` is empty or
+    `max_size` is 0. """
+    global _CACHE  # pylint:disable=global-statement
+    _LOG.debug("configure(%r, %r, %r)", directory, max_size, fresh_time)
+    if not directory or not max_size:
+        _CACHE = None
+        return
+    _CACHE = HttpCache(directory, max_size, fresh_time)
+
+
+def get_stats():
+    """ Get cache statistics; empty when cache is disabled. """
+    cache = _CACHE
+    return cache.get_stats() if cache is not None else {}
+
+
+def _cached_response(entry, url, etag, modified, max_size):
+    info, content = entry.response(etag, modified)
+    if content is not None:
+        check_size(len(content), max_size, url)
+    return info, content
+
+
+def download(download_page, url, etag=None, modified=None, max_size=None):
+    """ Download page by `download_page` function using cache.
+
+    Fresh cached pages are returned without request; stale pages are
+    revalidated with its own validators, so caller get whole content even
+    when page was downloaded earlier for other source. `max_size` is
+    checked also for cached pages.
+    """
+    cache = _CACHE
+    if cache is None:
+        return download_page(url, etag, modified, max_size)
+    with cache.lock_url(url):
+        entry = cache.get(url)
+        if entry is not None and entry.is_fresh():
+            cache.count('hits')
+            return _cached_response(entry, url, etag, modified, max_size)
+        if entry is not None and entry.has_validators():
+            info, content = download_page(url, entry.etag, entry.modified,
+                                          max_size)
+            if content is None and info['_status'] == 304:
+                cache.count('revalidated')
+                cache.refresh(url, entry)
+                return _cached_response(entry, url, etag, modified,
+                                        max_size)
+        else:
+            info, content = download_page(url, etag, modified, max_size)
+        cache.count('misses')
+        if content is not None:
+            cache.put(url, info, content)
+        return info, content
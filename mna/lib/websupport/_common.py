@@ -0,0 +1,200 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" Web support functions - common for all backends """
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2015"
+__version__ = "2015-06-11"
+
+import time
+import urlparse
+import calendar
+import threading
+import contextlib
+
+from . import errors
+import email.utils as eut
+
+# http status codes that mean "try again later"
+RETRY_STATUSES = (429, 503)
+# http status codes of permanent redirects
+PERMANENT_REDIRECTS = (301, 308)
+# per-thread counters
+_COUNTERS = threading.local()
+# default max number of concurrent connections to one host
+HOST_LIMIT = 8
+# default number of hosts with kept-alive connections
+POOL_HOSTS = 50
+# default timeouts (sec) of connecting and reading
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 30
+# default max size (bytes) of downloaded content (after decompression)
+MAX_SIZE = 10 * 1024 * 1024
+# size of chunks read from connection
+CHUNK_SIZE = 64 * 1024
+# total number of bytes received (wire) and after decompression (decoded)
+_TOTALS = {'wire': 0, 'decoded': 0}
+_TOTALS_LOCK = threading.Lock()
+
+
+def add_downloaded(wire, decoded):
+    """ Count bytes downloaded by current thread.
+
+    Args:
+        wire: number of bytes received
+        decoded: number of bytes after decompression
+    """
+    _COUNTERS.downloaded = getattr(_COUNTERS, 'downloaded', 0) + wire
+    with _TOTALS_LOCK:
+        _TOTALS['wire'] += wire
+        _TOTALS['decoded'] += decoded
+
+
+def reset_downloaded():
+    """ Get number of bytes downloaded by current thread since last reset
+    and reset counter. """
+    result = getattr(_COUNTERS, 'downloaded', 0)
+    _COUNTERS.downloaded = 0
+    return result
+
+
+def add_download_time(seconds):
+    """ Count time spent by current thread on downloading. """
+    _COUNTERS.download_time = getattr(_COUNTERS, 'download_time', 0.0) + \
+        seconds
+
+
+def reset_download_time():
+    """ Get time (sec) spent by current thread on downloading since last
+    reset and reset counter. """
+    result = getattr(_COUNTERS, 'download_time', 0.0)
+    _COUNTERS.download_time = 0.0
+    return result
+
+
+def add_status(status, cached=False):
+    """ Count responses 200 and 304 received by current thread; responses
+    from cache are counted separately. """
+    if cached:
+        _COUNTERS.cached = getattr(_COUNTERS, 'cached', 0) + 1
+    elif status == 200:
+        _COUNTERS.modified = getattr(_COUNTERS, 'modified', 0) + 1
+    elif status == 304:
+        _COUNTERS.not_modified = getattr(_COUNTERS, 'not_modified', 0) + 1
+
+
+def reset_statuses():
+    """ Get number of responses 200, 304 and from cache received by current
+    thread since last reset and reset counters.
+
+    Return:
+        (modified, not modified, cached)
+    """
+    result = (getattr(_COUNTERS, 'modified', 0),
+              getattr(_COUNTERS, 'not_modified', 0),
+              getattr(_COUNTERS, 'cached', 0))
+    _COUNTERS.modified = _COUNTERS.not_modified = _COUNTERS.cached = 0
+    return result
+
+
+def add_counters(downloaded, modified, not_modified, cached):
+    """ Add to current thread counters values collected by other thread. """
+    _COUNTERS.downloaded = getattr(_COUNTERS, 'downloaded', 0) + downloaded
+    _COUNTERS.modified = getattr(_COUNTERS, 'modified', 0) + modified
+    _COUNTERS.not_modified = getattr(_COUNTERS, 'not_modified', 0) + \
+        not_modified
+    _COUNTERS.cached = getattr(_COUNTERS, 'cached', 0) + cached
+
+
+def get_header(info, name):
+    """ Get header `name` (lower case) from `info` ignoring case. """
+    for key, val in info.iteritems():
+        if key.lower() == name:
+            return val
+    return None
+
+
+def get_totals():
+    """ Get total number of bytes received (wire) and after decompression
+    (decoded). """
+    with _TOTALS_LOCK:
+        return dict(_TOTALS)
+
+
+def check_size(size, max_size, url):
+    """ Raise LoadPageError when `size` exceed `max_size`. """
+    if max_size and size > max_size:
+        raise errors.LoadPageError("%s: content too large (more than %d "
+                                   "bytes)" % (url, max_size))
+
+
+class HostLimiter(object):
+    """ Limit number of concurrent requests to one host; count requests and
+    waits for free connection. """
+
+    def __init__(self, limit=HOST_LIMIT):
+        self._lock = threading.Lock()
+        self._limit = limit
+        # host -> semaphore
+        self._semaphores = {}
+        # host -> number of requests
+        self.hosts = {}
+        self.requests = 0
+        self.waits = 0
+        self.wait_time = 0.0
+
+    def set_limit(self, limit):
+        """ Set max number of concurrent requests per host (for new
+        requests). """
+        with self._lock:
+            self._limit = max(limit, 1)
+            self._semaphores = {}
+
+    @contextlib.contextmanager
+    def acquire(self, url):
+        """ Context manager - wait for free connection to `url` host. """
+        host = urlparse.urlsplit(url).netloc.lower()
+        with self._lock:
+            sem = self._semaphores.get(host)
+            if sem is None:
+                sem = self._semaphores[host] = \
+                    threading.BoundedSemaphore(self._limit)
+            self.requests += 1
+            self.hosts[host] = self.hosts.get(host, 0) + 1
+        if not sem.acquire(False):
+            start = time.time()
+            sem.acquire()
+            with self._lock:
+                self.waits += 1
+                self.wait_time += time.time() - start
+        try:
+            yield
+        finally:
+            sem.release()
+
+    def get_stats(self):
+        with self._lock:
+            return {'requests': self.requests, 'hosts': len(self.hosts),
+                    'waits': self.waits,
+                    'wait_time': round(self.wait_time, 3)}
+
+
+LIMITER = HostLimiter()
+
+
+def parse_retry_after(value, now=None):
+    """ Parse Retry-After header value (seconds or http date).
+
+    Return:
+        number of seconds to wait or None
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    date = eut.parsedate_tz(value)
+    if not date:
+        return None
+    timestamp = calendar.timegm(date[:9]) - (date[9] or 0)
+    return max(int(timestamp - (now or time.time())), 0)
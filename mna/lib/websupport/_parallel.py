@@ -0,0 +1,115 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+""" Web support functions - downloading many pages concurrently.
+
+Copyright (c) Karol Będkowski, 2015
+
+This file is part of mna
+Licence: GPLv2+
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2015"
+__version__ = "2015-06-16"
+
+import time
+import logging
+import threading
+import Queue
+
+from . import errors
+from . import _common
+
+_LOG = logging.getLogger(__name__)
+
+# default number of concurrent downloads
+CONCURRENCY = 4
+# interval (sec) of checking downloads timeout
+_CHECK_INTERVAL = 0.5
+
+
+class _Task(object):
+    """ One page to download. """
+
+    def __init__(self, url):
+        self.url = url
+        self.started = None
+        self.content = None
+        self.error = None
+        self.done = threading.Event()
+
+
+def _worker(download, tasks, cancelled):
+    """ Download pages from `tasks` queue; move counters of downloaded bytes
+    and responses to task so they can be added to calling thread. """
+    while not cancelled.is_set():
+        try:
+            task = tasks.get(False)
+        except Queue.Empty:
+            return
+        task.started = time.time()
+        _common.reset_downloaded()
+        _common.reset_statuses()
+        try:
+            _info, task.content = download(task.url)
+        except errors.LoadPageError, err:
+            task.error = err
+        except Exception, err:  # pylint:disable=broad-except
+            _LOG.exception("download_pages: %s error: %r", task.url, err)
+            task.error = errors.LoadPageError(str(err))
+        task.counters = (_common.reset_downloaded(), ) + \
+            _common.reset_statuses()
+        task.done.set()
+
+
+def _wait(task, timeout):
+    """ Wait for `task`; return False when task exceeded `timeout`. """
+    while not task.done.wait(_CHECK_INTERVAL):
+        if timeout and task.started and time.time() - task.started > timeout:
+            return False
+    return True
+
+
+def download_pages(download, urls, concurrency=CONCURRENCY, timeout=None):
+    """ Download pages from `urls` by `download` function in up to
+    `concurrency` threads.
+
+    Args:
+        download: function(url) -> (info, content)
+        urls: list of urls
+        concurrency: max number of concurrent downloads
+        timeout: max time (sec) of downloading one page
+
+    Return:
+        iterator of (url, content, error) in order of `urls`; content is None
+        when page was not modified or on error (LoadPageError in error).
+    """
+    tasks = [_Task(url) for url in urls]
+    if not tasks:
+        return
+    tasks_q = Queue.Queue()
+    for task in tasks:
+        tasks_q.put(task)
+    cancelled = threading.Event()
+    for _dummy in xrange(min(max(concurrency, 1), len(tasks))):
+        thr = threading.Thread(target=_worker,
+                               args=(download, tasks_q, cancelled))
+        thr.daemon = True
+        thr.start()
+    try:
+        for task in tasks:
+            # time of waiting for downloads in other threads is counted as
+            # download time of calling thread
+            start = time.time()
+            finished = _wait(task, timeout)
+            _common.add_download_time(time.time() - start)
+            if not finished:
+                _LOG.warn("download_pages: %s timeout", task.url)
+                yield task.url, None, errors.LoadPageError(
+                    "%s: timeout" % task.url)
+                continue
+            _common.add_counters(*task.counters)
+            yield task.url, task.content, task.error
+    finally:
+        # caller stopped iteration or all done - don't start new downloads
+        cancelled.set()
@@ -8,11 +8,14 @@ __copyright__ = "Copyright (c) Karol Będkowski, 2014-2015"
 __version__ = "2015-01-18"
 
 import urllib2
+import socket
+import zlib
 import time
 import datetime
 import logging
 
 from . import errors
+from . import _common
 
 _LOG = logging.getLogger(__name__)
 
@@ -26,7 +29,111 @@ class _DefaultErrorHandler(urllib2.HTTPDefaultErrorHandler):
         return result
 
 
-def download_page(url, etag=None, modified=None):
+class _RedirectHandler(urllib2.HTTPRedirectHandler):
+    """ Remember final url and if all redirects was permanent in original
+    request. """
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        new_req = urllib2.HTTPRedirectHandler.redirect_request(
+            self, req, fp, code, msg, headers, newurl)
+        if new_req is not None:
+            origin = getattr(req, 'origin', req)
+            new_req.origin = origin
+            origin.redirect = newurl
+            origin.permanent_redirect = \
+                getattr(origin, 'permanent_redirect', True) and \
+                code in _common.PERMANENT_REDIRECTS
+        return new_req
+
+
+# shared opener
+_OPENER = urllib2.build_opener(_DefaultErrorHandler(), _RedirectHandler())
+
+
+# connection timeout (sec); urllib2 has one timeout for connect and read
+_TIMEOUT = _common.READ_TIMEOUT
+# default max size of content
+_MAX_SIZE = _common.MAX_SIZE
+
+
+def configure(host_limit=_common.HOST_LIMIT, _pool_hosts=None,
+              connect_timeout=_common.CONNECT_TIMEOUT,
+              read_timeout=_common.READ_TIMEOUT, max_size=_common.MAX_SIZE):
+    """ Configure max number of concurrent connections to one host,
+    timeouts and default max size of content. """
+    global _TIMEOUT, _MAX_SIZE  # pylint:disable=global-statement
+    _common.LIMITER.set_limit(host_limit)
+    _TIMEOUT = max(connect_timeout, read_timeout)
+    _MAX_SIZE = max_size
+
+
+def get_stats():
+    """ Get connections statistics; urllib2 do not reuse connections. """
+    stats = _common.LIMITER.get_stats()
+    stats['connections'] = stats['requests']
+    stats.update(_common.get_totals())
+    return stats
+
+
+class _DeflateDecoder(object):
+    """ Decoder for "deflate" content encoding - zlib stream or raw deflate
+    (sent by some servers). """
+
+    def __init__(self):
+        self._obj = None
+
+    def decompress(self, data):
+        if self._obj is None:
+            self._obj = zlib.decompressobj()
+            try:
+                return self._obj.decompress(data)
+            except zlib.error:
+                self._obj = zlib.decompressobj(-zlib.MAX_WBITS)
+        return self._obj.decompress(data)
+
+    def flush(self):
+        return self._obj.flush() if self._obj is not None else ""
+
+
+def _create_decoder(content_encoding):
+    content_encoding = (content_encoding or '').strip().lower()
+    if content_encoding in ('gzip', 'x-gzip'):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if content_encoding == 'deflate':
+        return _DeflateDecoder()
+    return None
+
+
+def _read_content(conn, url, max_size):
+    """ Read and decompress content in chunks; abort when content exceed
+    `max_size`.
+
+    Return:
+        (content, number of bytes received)
+    """
+    decoder = _create_decoder(conn.headers.get('content-encoding'))
+    chunks = []
+    size = wire_size = 0
+    try:
+        while True:
+            chunk = conn.read(_common.CHUNK_SIZE)
+            if not chunk:
+                break
+            wire_size += len(chunk)
+            if decoder is not None:
+                chunk = decoder.decompress(chunk)
+            size += len(chunk)
+            _common.check_size(size, max_size, url)
+            chunks.append(chunk)
+        if decoder is not None:
+            chunks.append(decoder.flush())
+    except zlib.error, err:
+        raise errors.LoadPageError("%s: invalid compressed content: %s" %
+                                   (url, err))
+    return "".join(chunks), wire_size
+
+
+def download_page(url, etag=None, modified=None, max_size=None):
     """ Download Page from `url` with optional last etag and modified time.
         When no updates return code 304 and no content.
 
@@ -34,6 +141,7 @@ def download_page(url, etag=None, modified=None):
         url (str): address object to download
         etag (str): optional previous etag
         modified (str): optional previous modification date
+        max_size (int): optional max size of content (default: configured)
 
     Return:
         (page headers, page content)
@@ -42,21 +150,37 @@ def download_page(url, etag=None, modified=None):
             _status - connection status code
             _modified - last modified date
             _url - page url
+            _redirect - final url when request was redirected
+            _permanent_redirect - all redirects was permanent
+            _size - content size
+            _wire_size - number of bytes received
     """
     request = urllib2.Request(url)
-    opener = urllib2.build_opener(_DefaultErrorHandler())
     if modified:
         request.add_header('If-Modified-Since', modified)
     if etag:
         request.add_header('If-None-Match', etag)
+    request.add_header('Accept-Encoding', 'gzip, deflate')
     request.add_header(
         'User-Agent',
         'Mozilla/5.0 (X11; Linux i686; rv:36.0) Gecko/20100101 Firefox/36.0')
     try:
-        conn = opener.open(request, timeout=10)
+        with _common.LIMITER.acquire(url):
+            conn = _OPENER.open(request, timeout=_TIMEOUT)
+            try:
+                content, wire_size = _read_content(conn, url,
+                                                   max_size or _MAX_SIZE) \
+                    if conn.code == 200 else (None, 0)
+            finally:
+                conn.close()
         info = dict(conn.headers)
         info['_status'] = conn.code
         info['_url'] = url
+        info['_size'] = len(content) if content is not None else 0
+        info['_wire_size'] = wire_size
+        if getattr(request, 'redirect', None):
+            info['_redirect'] = request.redirect
+            info['_permanent_redirect'] = request.permanent_redirect
         info['_encoding'] = conn.headers.getencoding()
         if info['_encoding'] == '7bit':
             info['_encoding'] = None
@@ -67,10 +191,15 @@ def download_page(url, etag=None, modified=None):
                 datetime.datetime.fromtimestamp(time.mktime(modified)) \
                 if modified else None
         if conn.code == 200:
-            content = conn.read()
+            _common.add_downloaded(wire_size, len(content))
             return info, content
         elif conn.code == 304:  # not modified
             return info, None
-        raise errors.LoadPageError("%d: %s" % (conn.status, conn.reason))
-    except urllib2.URLError, err:
+        retry_after = None
+        if conn.code in _common.RETRY_STATUSES:
+            retry_after = _common.parse_retry_after(
+                conn.headers.get('Retry-After'))
+        raise errors.LoadPageError("%d: %s" % (conn.code, conn.reason),
+                                   conn.code, retry_after)
+    except (urllib2.URLError, socket.error), err:
         raise errors.LoadPageError(err)
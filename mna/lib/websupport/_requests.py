@@ -13,8 +13,10 @@ import logging
 import email.utils as eut
 
 import requests
+from requests import adapters
 
 from . import errors
+from . import _common
 
 _LOG = logging.getLogger(__name__)
 
@@ -28,9 +30,75 @@ def _parse_date(date):
 _SESSION = requests.Session()
 _SESSION.headers['User-Agent'] = 'Mozilla/5.0 (X11; Linux i686; rv:36.0) '\
         'Gecko/20100101 Firefox/36.0'
+_SESSION.headers['Accept-Encoding'] = 'gzip, deflate'
+_ADAPTER = None
+# (connect, read) timeouts
+_TIMEOUT = (_common.CONNECT_TIMEOUT, _common.READ_TIMEOUT)
+# default max size of content
+_MAX_SIZE = _common.MAX_SIZE
 
 
-def download_page(url, etag=None, modified=None):
+def configure(host_limit=_common.HOST_LIMIT, pool_hosts=_common.POOL_HOSTS,
+              connect_timeout=_common.CONNECT_TIMEOUT,
+              read_timeout=_common.READ_TIMEOUT, max_size=_common.MAX_SIZE):
+    """ Configure shared connections pool.
+
+    Args:
+        host_limit: max number of concurrent connections to one host
+        pool_hosts: number of hosts with kept-alive connections
+        connect_timeout: max time (sec) of connecting
+        read_timeout: max time (sec) of waiting for data
+        max_size: default max size (bytes) of content
+    """
+    global _ADAPTER, _TIMEOUT, _MAX_SIZE  # pylint:disable=global-statement
+    _LOG.debug("configure(%r, %r, %r, %r, %r)", host_limit, pool_hosts,
+               connect_timeout, read_timeout, max_size)
+    _TIMEOUT = (connect_timeout, read_timeout)
+    _MAX_SIZE = max_size
+    _common.LIMITER.set_limit(host_limit)
+    adapter = adapters.HTTPAdapter(pool_connections=pool_hosts,
+                                   pool_maxsize=host_limit, pool_block=True)
+    _SESSION.mount('http://', adapter)
+    _SESSION.mount('https://', adapter)
+    _ADAPTER = adapter
+
+
+def get_stats():
+    """ Get connections pool statistics. """
+    stats = _common.LIMITER.get_stats()
+    pools = _ADAPTER.poolmanager.pools
+    connections = 0
+    for key in pools.keys():
+        pool = pools.get(key)
+        if pool is not None:
+            connections += pool.num_connections
+    stats['connections'] = connections
+    stats.update(_common.get_totals())
+    return stats
+
+
+configure()
+
+
+def _read_content(request, url, max_size):
+    """ Read content in chunks; abort when content exceed `max_size`.
+
+    Return:
+        (content, number of bytes received)
+    """
+    length = request.headers.get('content-length')
+    if length and length.isdigit():
+        _common.check_size(int(length), max_size, url)
+    chunks = []
+    size = 0
+    for chunk in request.iter_content(_common.CHUNK_SIZE):
+        size += len(chunk)
+        _common.check_size(size, max_size, url)
+        chunks.append(chunk)
+    return "".join(chunks), request.raw.tell()
+
+
+def download_page(url, etag=None, modified=None, max_size=None):
     """ Download Page from `url` with optional last etag and modified time.
         When no updates return code 304 and no content.
 
@@ -38,6 +106,7 @@ def download_page(url, etag=None, modified=None):
         url (str): address object to download
         etag (str): optional previous etag
         modified (str): optional previous modification date
+        max_size (int): optional max size of content (default: configured)
 
     Return:
         (page headers, page content)        Custom page headers:
@@ -46,6 +115,10 @@ def download_page(url, etag=None, modified=None):
             _status - connection status code
             _modified - last modified date
             _url - page url
+            _redirect - final url when request was redirected
+            _permanent_redirect - all redirects was permanent
+            _size - content size
+            _wire_size - number of bytes received
     """
     headers = {}
     if modified:
@@ -54,10 +127,26 @@ def download_page(url, etag=None, modified=None):
         headers['If-None-Match'] = etag
 
     try:
-        request = _SESSION.get(url, headers=headers)
+        with _common.LIMITER.acquire(url):
+            request = _SESSION.get(url, headers=headers, timeout=_TIMEOUT,
+                                   stream=True)
+            try:
+                content, wire_size = _read_content(request, url,
+                                                   max_size or _MAX_SIZE)
+            finally:
+                # return connection to pool; close it when not whole
+                # content was read
+                request.close()
         info = dict(request.headers)
         info['_status'] = request.status_code
         info['_url'] = url
+        info['_size'] = len(content)
+        info['_wire_size'] = wire_size
+        if request.history:
+            info['_redirect'] = request.url
+            info['_permanent_redirect'] = all(
+                resp.status_code in _common.PERMANENT_REDIRECTS
+                for resp in request.history)
         info['_encoding'] = request.encoding
         if info['_encoding'] == '7bit':
             info['_encoding'] = None
@@ -68,11 +157,16 @@ def download_page(url, etag=None, modified=None):
                 datetime.datetime.fromtimestamp(time.mktime(modified)) \
                 if modified else None
         if request.status_code == 200:
-            content = request.content
+            _common.add_downloaded(wire_size, len(content))
             return info, content
         elif request.status_code == 304:  # not modified
             return info, None
-        raise errors.LoadPageError("%d: %s" % (request.status_code,
-                                               request.reason))
-    except urllib2.URLError, err:
+        retry_after = None
+        if request.status_code in _common.RETRY_STATUSES:
+            retry_after = _common.parse_retry_after(
+                request.headers.get('Retry-After'))
+        raise errors.LoadPageError(
+            "%d: %s" % (request.status_code, request.reason),
+            request.status_code, retry_after)
+    except (urllib2.URLError, requests.RequestException), err:
         raise errors.LoadPageError(err)
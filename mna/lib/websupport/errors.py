@@ -4,8 +4,20 @@
 
 __author__ = "Karol Będkowski"
 __copyright__ = "Copyright (c) Karol Będkowski, 2014-2015"
-__version__ = "2015-02-21"
+__version__ = "2015-06-11"
 
 
 class LoadPageError(RuntimeError):
-    pass
+    """ Page loading error.
+
+    Args:
+        message: error message
+        status: optional http status code
+        retry_after: optional number of seconds server ask to wait before
+            next request
+    """
+
+    def __init__(self, message, status=None, retry_after=None):
+        super(LoadPageError, self).__init__(message)
+        self.status = status
+        self.retry_after = retry_after
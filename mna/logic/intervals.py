@@ -0,0 +1,125 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Sources refresh intervals.
+
+Copyright (c) Karol Będkowski, 2015
+
+This file is part of mna
+Licence: GPLv2+
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2015"
+__version__ = "2015-06-11"
+
+import time
+import random
+import logging
+
+from mna.lib import appconfig
+
+_LOG = logging.getLogger(__name__)
+
+# number of remembered refreshes that found new articles
+_ARRIVALS_HISTORY = 16
+# minimal number of arrivals required to compute adaptive interval
+_ARRIVALS_MIN = 3
+# maximal accepted Retry-After (minutes)
+_RETRY_AFTER_MAX = 7 * 24 * 60
+
+
+def record_arrival(source_cfg, new_articles_cnt, now_ts=None):
+    """ Remember time of refresh when new articles was found.
+
+    Args:
+        source_cfg (Source): source configuration
+        new_articles_cnt (int): number of new articles
+        now_ts (float): optional current timestamp
+    """
+    if not new_articles_cnt:
+        return
+    arrivals = list(source_cfg.meta.get('arrivals') or [])
+    arrivals.append(int(now_ts or time.time()))
+    source_cfg.meta['arrivals'] = arrivals[-_ARRIVALS_HISTORY:]
+
+
+def _median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def get_interval(source_cfg, aconf=None, now_ts=None):
+    """ Get refresh interval for source.
+
+    When source has no own interval and adaptive intervals are enabled
+    (`articles.adaptive_interval`) interval is computed as half of expected
+    time between new articles (median of gaps between refreshes that found
+    new articles; or time since last new article when it is longer),
+    bounded by `articles.adaptive_interval_min` and
+    `articles.adaptive_interval_max`.
+
+    Args:
+        source_cfg (Source): source configuration
+        aconf (AppConfig): optional application configuration
+        now_ts (float): optional current timestamp
+
+    Returns:
+        (interval in minutes, reason)
+    """
+    if source_cfg.interval:
+        return source_cfg.interval, "source interval"
+    aconf = aconf or appconfig.AppConfig()
+    default = aconf.get('articles.update_interval', 60)
+    if not aconf.get('articles.adaptive_interval', True):
+        return default, "default interval"
+    arrivals = (source_cfg.meta or {}).get('arrivals') or []
+    if len(arrivals) < _ARRIVALS_MIN:
+        return default, "default interval; not enough history (%d/%d)" % \
+            (len(arrivals), _ARRIVALS_MIN)
+    gaps = [(cur - prev) / 60.0 for prev, cur in zip(arrivals, arrivals[1:])]
+    median_gap = _median(gaps)
+    since_last = ((now_ts or time.time()) - arrivals[-1]) / 60.0
+    expected = max(median_gap, since_last)
+    min_interval = aconf.get('articles.adaptive_interval_min', 5)
+    max_interval = aconf.get('articles.adaptive_interval_max', 1440)
+    interval = int(min(max(expected / 2, min_interval), max_interval))
+    reason = "adaptive; median gap %d min, last new %d min ago" % \
+        (median_gap, since_last)
+    if interval == min_interval:
+        reason += "; limited to minimum"
+    elif interval == max_interval:
+        reason += "; limited to maximum"
+    return interval, reason
+
+
+def get_retry_delay(source_cfg, retry_after=None, aconf=None):
+    """ Get delay to next try for failing source.
+
+    Delay grow exponentially with `failure_counter` starting from regular
+    source interval up to `sources.backoff_max` minutes; random jitter
+    (half of delay) spread retries in time. Server requested delay
+    (`retry_after`) is used when it is longer.
+
+    Args:
+        source_cfg (Source): source configuration
+        retry_after (int): optional number of seconds requested by server
+        aconf (AppConfig): optional application configuration
+
+    Returns:
+        (delay in minutes, reason)
+    """
+    aconf = aconf or appconfig.AppConfig()
+    interval, _reason = get_interval(source_cfg, aconf)
+    failures = min(max(source_cfg.failure_counter or 1, 1), 30)
+    delay = min(interval * 2 ** (failures - 1),
+                aconf.get('sources.backoff_max', 2880))
+    delay = delay / 2.0 + random.uniform(0, delay / 2.0)
+    reason = "backoff after %d failure(s)" % failures
+    if retry_after and retry_after / 60.0 > delay:
+        delay = min(retry_after / 60.0, _RETRY_AFTER_MAX)
+        reason = "server requested retry after %d s" % retry_after
+    return delay, reason
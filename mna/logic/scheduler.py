@@ -0,0 +1,136 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" In-memory sources refresh scheduler.
+
+Copyright (c) Karol Będkowski, 2015
+
+This file is part of mna
+Licence: GPLv2+
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2015"
+__version__ = "2015-06-10"
+
+import heapq
+import logging
+import datetime
+import threading
+
+from mna.model import db
+from mna.model import dbobjects as DBO
+
+_LOG = logging.getLogger(__name__)
+
+
+class Scheduler(object):
+    """ Keep min-heap of (next_refresh, source_oid) for enabled sources.
+
+    Heap is loaded once from database; later is updated by `schedule` and
+    `remove` calls. Outdated heap entries are skipped on pop (entry is valid
+    only when match current date in `_deadlines`).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heap = []
+        # source_oid -> next_refresh
+        self._deadlines = {}
+        # function called when earlier deadline is scheduled
+        self.listener = None
+
+    def load(self, session=None):
+        """ Load enabled sources from database. """
+        session = session or db.Session()
+        query = session.query(DBO.Source.oid, DBO.Source.next_refresh).\
+            filter(DBO.Source.enabled == 1,
+                   DBO.Source.deleted == None)
+        with self._lock:
+            self._deadlines = dict((oid, next_refresh or datetime.datetime.min)
+                                   for oid, next_refresh in query)
+            self._compact()
+        _LOG.info("Scheduler.load: %d sources", len(self._heap))
+        self._notify()
+
+    def schedule(self, source_oid, next_refresh=None):
+        """ Add or update `source_oid` to refresh at `next_refresh`
+        (default: now). """
+        next_refresh = next_refresh or datetime.datetime.now()
+        _LOG.debug("Scheduler.schedule(%r, %r)", source_oid, next_refresh)
+        with self._lock:
+            if self._deadlines.get(source_oid) == next_refresh:
+                return
+            first = self._first_deadline()
+            self._deadlines[source_oid] = next_refresh
+            heapq.heappush(self._heap, (next_refresh, source_oid))
+            if len(self._heap) > 2 * len(self._deadlines) + 64:
+                self._compact()
+            earlier = first is None or next_refresh < first
+        if earlier:
+            self._notify()
+
+    def schedule_all(self, sources):
+        """ Schedule many sources.
+
+        Args:
+            sources: iter((source_oid, next_refresh))
+        """
+        for source_oid, next_refresh in sources:
+            self.schedule(source_oid, next_refresh)
+
+    def remove(self, source_oid):
+        """ Remove `source_oid` from scheduler (i.e. disabled/deleted). """
+        _LOG.debug("Scheduler.remove(%r)", source_oid)
+        with self._lock:
+            self._deadlines.pop(source_oid, None)
+
+    def pop_due(self, now=None):
+        """ Remove from scheduler and return sources with deadline <= `now`
+        ordered by deadline. """
+        now = now or datetime.datetime.now()
+        due = []
+        with self._lock:
+            heap = self._heap
+            while heap and heap[0][0] <= now:
+                next_refresh, source_oid = heapq.heappop(heap)
+                if self._deadlines.get(source_oid) == next_refresh:
+                    del self._deadlines[source_oid]
+                    due.append(source_oid)
+        return due
+
+    def get_wait_time(self, now=None):
+        """ Get seconds to next deadline; 0 when some source is due;
+        None when nothing is scheduled. """
+        with self._lock:
+            first = self._first_deadline()
+        if first is None:
+            return None
+        now = now or datetime.datetime.now()
+        return max((first - now).total_seconds(), 0)
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def _first_deadline(self):
+        """ Find first valid deadline; drop outdated entries. Require lock. """
+        heap = self._heap
+        while heap:
+            next_refresh, source_oid = heap[0]
+            if self._deadlines.get(source_oid) == next_refresh:
+                return next_refresh
+            heapq.heappop(heap)
+        return None
+
+    def _compact(self):
+        """ Rebuild heap without outdated entries. Require lock. """
+        self._heap = [(next_refresh, oid) for oid, next_refresh
+                      in self._deadlines.iteritems()]
+        heapq.heapify(self._heap)
+
+    def _notify(self):
+        if self.listener:
+            self.listener()
+
+
+SCHEDULER = Scheduler()
@@ -0,0 +1,145 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Receivers of update events generated by background workers.
+
+Copyright (c) Karol Będkowski, 2015
+
+This file is part of mna
+Licence: GPLv2+
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2015"
+__version__ = "2015-06-14"
+
+import logging
+
+_LOG = logging.getLogger(__name__)
+
+
+class AbstractSink(object):
+    """ Update events receiver; methods are called from `WorkerGuiUpdate`
+    thread. """
+
+    def update_started(self, sources_cnt):
+        pass
+
+    def update_finished(self):
+        pass
+
+    def source_updating_start(self, source_id):
+        pass
+
+    def source_updated(self, source_id, group_id, title, new_articles_cnt,
+                       force=False):
+        pass
+
+    def source_update_error(self, source_id, group_id, title):
+        pass
+
+    def flush(self):
+        """ Send collected events. """
+        pass
+
+
+class QtSink(AbstractSink):
+    """ Forward events to gui by Qt `messenger`.
+
+    Sources updates, sources status changes and progress are collected and
+    sent in batches by `flush` so gui is re-laid out once per batch.
+    """
+
+    def __init__(self):
+        super(QtSink, self).__init__()
+        from mna.common import messenger
+        self._messenger = messenger
+        # source_id -> group_id of sources with new articles
+        self._updated = {}
+        # source_id -> status
+        self._statuses = {}
+        # number of finished sources
+        self._finished = 0
+
+    def update_started(self, sources_cnt):
+        msgr = self._messenger
+        msgr.MESSENGER.emit_announce(u"Starting sources update")
+        msgr.MESSENGER.emit_updating_status(msgr.ST_UPDATE_STARTED,
+                                            sources_cnt)
+
+    def update_finished(self):
+        self.flush()
+        msgr = self._messenger
+        msgr.MESSENGER.emit_announce(u"Update finished")
+        msgr.MESSENGER.emit_updating_status(msgr.ST_UPDATE_FINISHED)
+
+    def source_updating_start(self, source_id):
+        self._statuses[source_id] = 'updating'
+
+    def source_updated(self, source_id, group_id, title, new_articles_cnt,
+                       force=False):
+        if new_articles_cnt or force:
+            self._updated[source_id] = group_id
+        if new_articles_cnt:
+            self._messenger.MESSENGER.emit_announce(
+                u"%s updated - %d new articles" % (title, new_articles_cnt))
+        else:
+            self._messenger.MESSENGER.emit_announce(u"%s updated" % title)
+            self._statuses[source_id] = 'update_finished'
+        self._finished += 1
+
+    def source_update_error(self, source_id, group_id, title):
+        self._messenger.MESSENGER.emit_announce(
+            u"%s updated - update error" % title)
+        self._statuses[source_id] = 'update_finished'
+        self._finished += 1
+
+    def flush(self):
+        msgr = self._messenger
+        if self._statuses:
+            statuses, self._statuses = self._statuses, {}
+            msgr.MESSENGER.emit_sources_status(statuses)
+        if self._updated:
+            updated, self._updated = self._updated, {}
+            msgr.MESSENGER.emit_sources_updated(updated.items())
+        if self._finished:
+            finished, self._finished = self._finished, 0
+            msgr.MESSENGER.emit_updating_status(msgr.ST_UPDATE_PING,
+                                                finished)
+
+
+class LogSink(AbstractSink):
+    """ Write events to log and optionally to `stream` (i.e. stdout);
+    count updated sources, errors and new articles. """
+
+    def __init__(self, stream=None):
+        super(LogSink, self).__init__()
+        self._stream = stream
+        self.updated = 0
+        self.errors = 0
+        self.new_articles = 0
+
+    def _write(self, message):
+        _LOG.info(message)
+        if self._stream is not None:
+            self._stream.write(message.encode('utf-8', 'replace') + "\n")
+            self._stream.flush()
+
+    def update_started(self, sources_cnt):
+        self._write(u"Starting update of %d sources" % sources_cnt)
+
+    def update_finished(self):
+        self._write(u"Update finished: %d sources updated, %d errors, %d "
+                    u"new articles" % (self.updated, self.errors,
+                                       self.new_articles))
+
+    def source_updated(self, source_id, group_id, title, new_articles_cnt,
+                       force=False):
+        self.updated += 1
+        self.new_articles += new_articles_cnt
+        self._write(u"%s updated - %d new articles" % (title,
+                                                       new_articles_cnt))
+
+    def source_update_error(self, source_id, group_id, title):
+        self.errors += 1
+        self._write(u"%s updated - update error" % title)
@@ -13,6 +13,7 @@ import datetime
 
 from mna.model import db
 from mna.model import dbobjects as DBO
+from mna.logic.scheduler import SCHEDULER
 
 
 _LOG = logging.getLogger(__name__)
@@ -50,6 +51,10 @@ def save_source(source):
     _LOG.info("save_source %r", source)
     source.conf_updated = datetime.datetime.now()
     db.save(source, True)
+    if source.enabled and not source.deleted:
+        SCHEDULER.schedule(source.oid, source.next_refresh)
+    else:
+        SCHEDULER.remove(source.oid)
     _LOG.info("save_source done")
 
 
@@ -59,6 +64,7 @@ def delete_source(source_oid):
     source = db.get_one(DBO.Source, oid=source_oid)
     if source:
         db.delete(source, True)
+    SCHEDULER.remove(source_oid)
     _LOG.info("delete_source done")
     return True
 
@@ -67,29 +73,42 @@ def force_refresh_all():
     """ Force refresh all sources. """
     _LOG.info("Sources.force_refresh_all()")
     session = db.Session()
+    now = datetime.datetime.now()
     session.query(DBO.Source).\
         filter_by(processing=0).\
-        update({"next_refresh": datetime.datetime.now()})
+        update({"next_refresh": now})
     session.commit()
+    _schedule_now(session.query(DBO.Source.oid).
+                  filter_by(processing=0, enabled=1, deleted=None), now)
 
 
 def force_refresh(source_oid):
     _LOG.info("Sources.force_refresh(%r)", source_oid)
     session = db.Session()
-    session.query(DBO.Source).\
-        filter_by(oid=source_oid, processing=0).\
-        update({"next_refresh": datetime.datetime.now(),
-                "enabled": 1})
+    now = datetime.datetime.now()
+    if session.query(DBO.Source).\
+            filter_by(oid=source_oid, processing=0).\
+            update({"next_refresh": now, "enabled": 1}):
+        SCHEDULER.schedule(source_oid, now)
     session.commit()
 
 
 def force_refresh_by_group(group_oid):
     _LOG.info("Sources.force_refresh_by_group(%r)", group_oid)
     session = db.Session()
+    now = datetime.datetime.now()
     session.query(DBO.Source).\
         filter_by(group_id=group_oid, processing=0).\
-        update({"next_refresh": datetime.datetime.now()})
+        update({"next_refresh": now})
     session.commit()
+    _schedule_now(session.query(DBO.Source.oid).
+                  filter_by(group_id=group_oid, processing=0, enabled=1,
+                            deleted=None), now)
+
+
+def _schedule_now(query, now):
+    """ Put sources from `query` (returning source oid) into scheduler. """
+    SCHEDULER.schedule_all((oid, now) for oid, in query)
 
 
 def get_source_info(session, source_oid):
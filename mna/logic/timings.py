@@ -0,0 +1,144 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Sources refresh timings.
+
+Copyright (c) Karol Będkowski, 2015
+
+This file is part of mna
+Licence: GPLv2+
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2015"
+__version__ = "2015-06-14"
+
+import math
+import logging
+import itertools
+
+from sqlalchemy import select, and_
+
+from mna.model import db
+from mna.model import dbobjects as DBO
+
+_LOG = logging.getLogger(__name__)
+
+# refresh stages in order
+STAGES = ('download', 'fetch', 'parse', 'filter', 'store')
+# default number of timings kept for each source
+_KEEP = 20
+
+
+def add_timing(session, source_id, timings, downloaded, articles_cnt,
+               error=False, keep=_KEEP, modified=0, not_modified=0,
+               unchanged=False, cached=0):
+    """ Store timings of source refresh; remove old ones.
+
+    Args:
+        session: sqlalchemy session
+        source_id: source id
+        timings: dict stage -> duration in seconds (and "total")
+        downloaded: number of downloaded bytes
+        articles_cnt: number of new articles
+        error: refresh failed
+        keep: number of timings to keep for source
+        modified: number of 200 responses
+        not_modified: number of 304 responses
+        unchanged: parsing skipped because content was not changed
+        cached: number of responses from http cache
+    """
+    values = dict((stage, int(timings.get(stage, 0) * 1000))
+                  for stage in STAGES + ('total', ))
+    table = DBO.SourceTiming.__table__
+    session.execute(table.insert(), dict(
+        values, source_id=source_id, bytes=downloaded,
+        articles=articles_cnt, error=bool(error), modified=modified,
+        not_modified=not_modified, unchanged=bool(unchanged),
+        cached=cached))
+    last = select([table.c.oid]).where(table.c.source_id == source_id).\
+        order_by(table.c.oid.desc()).limit(keep)
+    session.execute(table.delete().where(and_(
+        table.c.source_id == source_id, ~table.c.oid.in_(last))))
+
+
+def percentile(values, pct):
+    """ Get `pct` percentile (nearest rank) of `values`. """
+    if not values:
+        return None
+    values = sorted(values)
+    idx = int(math.ceil(pct / 100.0 * len(values))) - 1
+    return values[min(max(idx, 0), len(values) - 1)]
+
+
+def get_source_stats(source_id, session=None):
+    """ Get aggregated timings for source.
+
+    Return:
+        list of (name, p50, p95) for stages, total time (ms) and downloaded
+        bytes; empty list when no timings
+    """
+    rows = db.get_all(DBO.SourceTiming, session=session,
+                      source_id=source_id).all()
+    if not rows:
+        return []
+    result = []
+    for name in STAGES + ('total', 'bytes'):
+        values = [getattr(row, name) or 0 for row in rows]
+        result.append((name, percentile(values, 50),
+                       percentile(values, 95)))
+    return result
+
+
+def get_source_revalidation(source_id, session=None):
+    """ Get summary of conditional requests for source.
+
+    Return:
+        (number of 200 responses, number of 304 responses, number of
+        responses from cache, number of refreshes with unchanged content,
+        estimated bytes saved by 304 responses) or None when no timings
+    """
+    rows = db.get_all(DBO.SourceTiming, session=session,
+                      source_id=source_id).all()
+    if not rows:
+        return None
+    modified = sum(row.modified or 0 for row in rows)
+    not_modified = sum(row.not_modified or 0 for row in rows)
+    cached = sum(row.cached or 0 for row in rows)
+    unchanged = sum(1 for row in rows if row.unchanged)
+    downloaded = sum(row.bytes or 0 for row in rows)
+    saved = not_modified * downloaded / modified if modified else 0
+    return modified, not_modified, cached, unchanged, saved
+
+
+def get_slowest_sources(limit=20, session=None):
+    """ Find sources with longest refresh (by p95 of total time).
+
+    Return:
+        list of (source title, number of refreshes, p50 total, p95 total,
+        p95 download, p95 fetch, p50 bytes, errors) sorted by p95 total
+        descending
+    """
+    session = session or db.Session()
+    rows = session.query(DBO.SourceTiming.source_id,
+                         DBO.SourceTiming.total,
+                         DBO.SourceTiming.download,
+                         DBO.SourceTiming.fetch,
+                         DBO.SourceTiming.bytes,
+                         DBO.SourceTiming.error).\
+        order_by(DBO.SourceTiming.source_id)
+    titles = dict(session.query(DBO.Source.oid, DBO.Source.title))
+    result = []
+    for source_id, timings in itertools.groupby(rows, lambda row: row[0]):
+        timings = list(timings)
+        totals = [row[1] or 0 for row in timings]
+        result.append((titles.get(source_id) or str(source_id),
+                       len(timings),
+                       percentile(totals, 50),
+                       percentile(totals, 95),
+                       percentile([row[2] or 0 for row in timings], 95),
+                       percentile([row[3] or 0 for row in timings], 95),
+                       percentile([row[4] or 0 for row in timings], 50),
+                       sum(1 for row in timings if row[5])))
+    result.sort(key=lambda row: row[3], reverse=True)
+    return result[:limit]
@@ -1,11 +1,18 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
-""" Worker """
+""" Worker
+
+Sources are refreshed by pipeline:
+    update queue (source ids) -> FetchWorker (get_items) -> parse queue
+        -> ParseWorker (build & filter articles) -> store queue
+        -> WriterWorker (the only thread writing results into database)
+Stages are joined by bounded queues so slow stage block previous ones.
+"""
 
 __author__ = u"Karol Będkowski"
 __copyright__ = u"Copyright (c) Karol Będkowski, 2014-2015"
-__version__ = "2015-01-30"
+__version__ = "2015-06-12"
 
 import os
 import logging
@@ -14,36 +21,184 @@ import threading
 import time
 import Queue
 
+from sqlalchemy import orm
+
 from mna.model import db
 from mna.model import dbobjects as DBO
 from mna import plugins
 from mna.model import base
 from mna.lib import appconfig
-from mna.common import messenger
+from mna.lib import procpool
+from mna.lib import websupport
 from mna.model import repo
+from mna.logic.scheduler import SCHEDULER
+from mna.logic import intervals
+from mna.logic import sinks
+from mna.logic import timings
 
 _LOG = logging.getLogger(__name__)
-_LONG_SLEEP = 15  # sleep when no source processed
-_SHORT_SLEEP = 1  # sleep after retrieve articles from source
-_WORKERS = 3  # number of background workers
+_WORKERS = 3  # number of background workers for "threads" engine
+_CONCURRENCY = 64  # default number of workers for "concurrent" engine
+_WORKER_STACK_SIZE = 512 * 1024  # stack size for "concurrent" engine workers
+_PARSERS = 2  # default number of parse/filter workers
+_QUEUE_SIZE = 32  # default size of queues between stages
+_WRITE_BATCH = 50  # max number of sources stored in one transaction
+_WRITE_WINDOW = 0.5  # max time (sec) of collecting sources to store
+_GUI_UPDATE_WINDOW = 0.5  # interval (sec) of sending collected gui events
+_SOURCE_TIMEOUT = 300  # max time (sec) of fetching one source
+_STOP_TIMEOUT = 15  # max time (sec) of waiting for workers on stop
 _STARTED = Queue.Queue()
 _ENDED = Queue.Queue()
+# Source attributes that may be changed during processing
+_SOURCE_UPDATED_ATTRS = ('title', 'icon_id', 'conf', 'meta', 'conf_updated',
+                         'next_refresh', 'last_refreshed', 'enabled',
+                         'failure_counter', 'last_error', 'last_error_date')
+
+
+class StageQueue(Queue.Queue):
+    """ Queue between pipeline stages; count processed items, maximal depth
+    and puts blocked by full queue. """
+
+    def __init__(self, name, maxsize=0):
+        Queue.Queue.__init__(self, maxsize)
+        self.name = name
+        self.processed = 0
+        self.max_depth = 0
+        self.full_waits = 0
+
+    def put(self, item, block=True, timeout=None):
+        if self.full():
+            self.full_waits += 1
+        Queue.Queue.put(self, item, block, timeout)
+
+    def _put(self, item):
+        Queue.Queue._put(self, item)
+        self.max_depth = max(self.max_depth, len(self.queue))
+
+    def _get(self):
+        self.processed += 1
+        return Queue.Queue._get(self)
+
+    def get_stats(self):
+        """ Get queue counters as dict. """
+        return {'depth': self.qsize(), 'max_depth': self.max_depth,
+                'processed': self.processed, 'full_waits': self.full_waits}
+
+
+class _Job(object):
+    """ Processing state of one source passed between pipeline stages. """
+    # pylint:disable=too-many-instance-attributes
+
+    def __init__(self, source_id):
+        self.source_id = source_id
+        # session for reading; owned by job; closed in parse stage
+        self.session = None
+        self.source_cfg = None
+        self.source = None
+        # articles (iterator) returned by source
+        self.articles = None
+        self.error = None
+        self.retry_after = None
+        self.started = datetime.datetime.now()
+        self.started_ts = time.time()
+        self.last_conf_updated = None
+        # stage -> duration (sec)
+        self.timings = {}
+        # bytes downloaded during processing
+        self.downloaded = 0
+        # number of responses 200 and 304 received during processing
+        self.modified = 0
+        self.not_modified = 0
+        # number of responses from http cache
+        self.cached = 0
+        # parsing skipped - content identical to previous one
+        self.unchanged = False
+        # job created by watchdog for source that exceeded time budget
+        self.timed_out = False
+        # source was not processed (not found, disabled, not due, missing
+        # plugin); only rescheduled by writer
+        self.skipped = False
+        # schedule next refresh at this date instead of stored one
+        self.reschedule_at = None
+        # results - filled in parse stage
+        self.source_values = None
+        self.new_logs = None
+        self.group_id = None
+        self.title = None
+        self.cnt = 0
+        self.force_update = False
+
+
+# ids of sources processing by pipeline
+_PROCESSING = set()
+# ids of sources scheduled again (i.e. forced refresh) during processing
+_REFRESH_REQUESTED = set()
+_PROCESSING_LOCK = threading.Lock()
+
+
+def _start_processing(source_id):
+    """ Mark source as processing; return False when already processed -
+    then source is refreshed again after current processing. """
+    with _PROCESSING_LOCK:
+        if source_id in _PROCESSING:
+            _REFRESH_REQUESTED.add(source_id)
+            return False
+        _PROCESSING.add(source_id)
+        return True
+
+
+def _end_processing(source_id):
+    """ Unmark processing source; return True when source should be
+    refreshed again. """
+    with _PROCESSING_LOCK:
+        _PROCESSING.discard(source_id)
+        if source_id in _REFRESH_REQUESTED:
+            _REFRESH_REQUESTED.discard(source_id)
+            return True
+        return False
+
+
+def _finish_processing(session, source_id):
+    """ End processing `source_id`; schedule requested refresh now when
+    source is still enabled. """
+    if not _end_processing(source_id):
+        return
+    _LOG.debug("_finish_processing: refresh %r requested", source_id)
+    now = datetime.datetime.now()
+    if session.query(DBO.Source).\
+            filter(DBO.Source.oid == source_id,
+                   DBO.Source.enabled == 1,
+                   DBO.Source.deleted == None).\
+            update({'next_refresh': now}, synchronize_session=False):
+        SCHEDULER.schedule(source_id, now)
+    session.commit()
 
 
 # pylint:disable=no-member,too-few-public-methods
 class Worker(threading.Thread):
-    """ Worker - process one source and store result in database.
+    """ Fetch worker - load source configuration and call source
+    `get_items`; pass result to parse stage.
 
     Arguments:
-        source_id: source to process
+        update_q: queue of source ids to process
+        parse_q: queue for next stage
+        terminate_event: stop processing event
+        gui_update_queue: queue for gui messages
     """
-    def __init__(self, update_q, terminate_event, gui_update_queue):
+    def __init__(self, update_q, parse_q, terminate_event, gui_update_queue):
         super(Worker, self).__init__()
         self.update_q = update_q
+        self.parse_q = parse_q
         self.gui_update_queue = gui_update_queue
         self.aconf = appconfig.AppConfig()
         self.terminate_event = terminate_event
         self._p_name = "Worker: id=%d" % id(self)
+        # (source_id, start timestamp) of currently processed source
+        self.current = None
+        # set by watchdog when worker exceeded time budget; result of
+        # processing is discarded and worker exits
+        self.abandoned = False
+        self.state_lock = threading.Lock()
 
     def run(self):
         while True:
@@ -55,135 +210,261 @@ class Worker(threading.Thread):
             if source_id is None:
                 self.update_q.task_done()
                 return
-            # _STARTED.put(source_id)
+            with self.state_lock:
+                self.current = (source_id, time.time())
+            job = None
             try:
-                self._run(source_id)
+                job = self._run(source_id)
             finally:
-                _LOG.debug('%s task done', self._p_name)
-                self.update_q.task_done()
-                # _ENDED.put(source_id)
+                with self.state_lock:
+                    self.current = None
+                    abandoned = self.abandoned
+                if abandoned:
+                    # source was already handled by watchdog
+                    _LOG.warn('%s abandoned; exiting', self._p_name)
+                    if job is not None:
+                        db.close_session(job.session)
+                elif job is None:
+                    # nothing to pass to next stages
+                    _LOG.debug('%s task done', self._p_name)
+                    self.update_q.task_done()
+            if abandoned:
+                return
+            if job is not None:
+                self.parse_q.put(job)
 
     def _run(self, source_id):
+        if not _start_processing(source_id):
+            _LOG.info("%s source %r already processing; refresh later",
+                      self._p_name, source_id)
+            return None
         self.gui_update_queue.put(('source_updating_start', source_id))
-        session = db.Session()  # autoflush=False, autocommit=False)
+        job = _Job(source_id)
+        try:
+            self._fetch(job)
+        except Exception, err:  # pylint:disable=broad-except
+            # error is passed to next stages like any other failure
+            _LOG.exception("%s processing %r error: %r", self._p_name,
+                           source_id, err)
+            job.error = str(err)
+            job.articles = None
+            if job.source_cfg is None:
+                job.skipped = True
+                job.reschedule_at = datetime.datetime.now() + \
+                    datetime.timedelta(minutes=self.aconf.get(
+                        'articles.update_interval', 60))
+        return job
+
+    def _fetch(self, job):
+        source_id = job.source_id
+        job.session = session = db.create_session()
         source_cfg = self._get_and_check_source(session, source_id)
-        if not source_cfg or source_cfg.processing:
-            _LOG.warn("%s not processing %r", self._p_name, source_cfg)
-            self.gui_update_queue.put(
-                ('source_update_error',
-                 (source_id,
-                  source_cfg.group_id if source_cfg else None,
-                  source_cfg.title if source_cfg else str(source_id))))
-            db.Session.remove()
+        if not source_cfg:
+            _LOG.warn("%s not processing %r", self._p_name, source_id)
+            job.skipped = True
+            job.error = "source not processed"
             return
 
         _LOG.debug("%s processing %s/%s", self._p_name, source_cfg.name,
                    source_cfg.title)
-        now = datetime.datetime.now()
-        source_cfg.processing = 1
-        session.commit()
-        last_conf_updated = source_cfg.conf_updated
+        job.title = source_cfg.title
+        job.group_id = source_cfg.group_id
 
         # find plugin
-        source = self._get_source(session, source_cfg)
+        job.source = source = self._get_source(source_cfg)
         if not source:
-            _LOG.error("%s source class not found for %r %r",
-                       self._p_name, source_cfg.name, source_cfg.title)
-            source_cfg.add_log("ERROR", "Internal error: source not found")
-            db.Session.remove()
+            # plugin may be unavailable only now (i.e. missing dependencies);
+            # source is not changed and checked again after regular interval
+            interval, _reason = intervals.get_interval(source_cfg, self.aconf)
+            job.skipped = True
+            job.error = "unknown source"
+            job.reschedule_at = datetime.datetime.now() + \
+                datetime.timedelta(minutes=interval)
             return
+        job.source_cfg = source_cfg
+        job.last_conf_updated = source_cfg.conf_updated
         # load articles
-        cnt = self._load_articles(source, source_cfg, session)
-        if cnt < 0:
-            self.gui_update_queue.put(('source_update_error',
-                                       (source_cfg.oid, source_cfg.group_id,
-                                        source_cfg.title)))
-            db.Session.remove()
-            return
-        # update configuration
-        force_update = bool(source_cfg.last_error) or \
-            last_conf_updated != source_cfg.conf_updated
-
-        interval = source_cfg.interval or self.aconf.get(
-            'articles.update_interval', 60)
-        source_cfg.next_refresh = now + datetime.timedelta(minutes=interval)
-        source_cfg.last_refreshed = now
-        source_cfg.processing = 0
-        source_cfg.failure_counter = 0
-        source_cfg.last_error = None
-        source_cfg.last_error_date = None
-
-        # store resources in repository
-        repository = repo.Reporitory()
-        for res_name, res_content in source.get_resources():
-            repository.store_file(res_name, res_content)
-
-        session.commit()
-        self.gui_update_queue.put(('source_update',
-                                   (source_cfg.oid, source_cfg.group_id,
-                                    source_cfg.title, cnt, force_update)))
-        _LOG.debug("%s finished", self._p_name)
-        db.Session.remove()
-        return
-
-    def _load_articles(self, source, source_cfg, session):
-        cnt = 0
+        websupport.reset_downloaded()
+        websupport.reset_statuses()
+        websupport.reset_download_time()
+        start = time.time()
         try:
-            articles = source.get_items(
+            job.articles = source.get_items(
                 session,
                 self.aconf.get('articles.max_num_load', 0),
                 self.aconf.get('articles.max_age_load', 0))
-            if articles:
-                if source_cfg.conf.get('filter.enabled', True):
-                    articles = self._filter_articles(articles, session,
-                                                     source_cfg)
-                    cnt = sum(_save_articls(articles, session, source_cfg))
-                    source_cfg.add_log('info', "Found new %d articles" % cnt)
         except base.GetArticleException, err:
             # some processing error occurred
             _LOG.error("%s Load articles from %s/%s error: %r",
                        self._p_name, source_cfg.name, source_cfg.title,
                        err)
-            _on_error(session, source_cfg, str(err))
-            return -1
+            job.error, job.retry_after = str(err), err.retry_after
         except Exception, err:  # pylint:disable=broad-except
             _LOG.exception("%s Load articles from %s/%s error: %r",
                            self._p_name, source_cfg.name, source_cfg.title,
                            err)
-            _on_error(session, source_cfg, str(err))
-            return -1
-        else:
-            _LOG.debug("%s Loaded %d from %s/%s", self._p_name, cnt,
-                       source_cfg.name, source_cfg.title)
-        return cnt
+            job.error = str(err)
+        _add_download_time(job, 'fetch', time.time() - start)
+        job.unchanged = source.content_unchanged
+        job.downloaded += websupport.reset_downloaded()
+        _add_statuses(job)
 
     # pylint: disable=no-self-use
     def _get_and_check_source(self, session, source_id):
         source_cfg = db.get_one(DBO.Source, session=session,
                                 oid=source_id)
-        if not source_cfg or \
-                source_cfg.next_refresh > datetime.datetime.now():
+        if not source_cfg or not source_cfg.enabled or source_cfg.deleted \
+                or source_cfg.next_refresh > datetime.datetime.now():
             return None
         return source_cfg
 
-    def _get_source(self, session, source_cfg):
+    def _get_source(self, source_cfg):
         source_cls = plugins.SOURCES.get(source_cfg.name)
         if not source_cls:
-            _LOG.error("%s unknown source: %s in %r", self._p_name,
-                       source_cls, source_cfg)
-            source_cfg.enabled = False
-            _on_error(session, source_cfg, "unknown source")
+            _LOG.error("%s source class %r not found for %r; skipping",
+                       self._p_name, source_cfg.name, source_cfg.title)
             return None
         source = source_cls(source_cfg)
         return source
 
-    def _load_filters(self, source_cfg, session):
+
+class ParseWorker(threading.Thread):
+    """ Parse worker - create & filter articles returned by source;
+    prepare source state to store.
+
+    Arguments:
+        parse_q: queue of jobs from fetch stage
+        store_q: queue for next (writer) stage
+    """
+
+    def __init__(self, parse_q, store_q):
+        super(ParseWorker, self).__init__()
+        self.parse_q = parse_q
+        self.store_q = store_q
+        self.aconf = appconfig.AppConfig()
+        self._p_name = "ParseWorker: id=%d" % id(self)
+        # (source_id, start timestamp) of currently processed job
+        self.current = None
+        # set by watchdog when worker exceeded time budget (see `Worker`)
+        self.abandoned = False
+        self.state_lock = threading.Lock()
+
+    def run(self):
+        while True:
+            job = self.parse_q.get()
+            if job is None:
+                return
+            with self.state_lock:
+                self.current = (job.source_id, time.time())
+            try:
+                self._run(job)
+            except Exception, err:  # pylint:disable=broad-except
+                _LOG.exception("%s processing %r error: %r", self._p_name,
+                               job.source_id, err)
+                job.error = job.error or str(err)
+                job.articles = None
+            finally:
+                # job results are complete; session no more needed
+                db.close_session(job.session)
+                job.session = None
+                with self.state_lock:
+                    self.current = None
+                    abandoned = self.abandoned
+            if abandoned:
+                # source was already handled by watchdog
+                _LOG.warn('%s abandoned; exiting', self._p_name)
+                return
+            self.store_q.put(job)
+
+    def _run(self, job):
+        if job.skipped:
+            return
+        if job.timed_out:
+            # fetch worker still hold original session & objects
+            job.session = db.create_session()
+            job.source_cfg = db.get_one(DBO.Source, session=job.session,
+                                        oid=job.source_id)
+        source_cfg = job.source_cfg
+        if source_cfg is None:
+            return
+        if job.error is None:
+            self._load_articles(job)
+        if job.error is not None:
+            _on_error(source_cfg, job.error, job.retry_after)
+        else:
+            self._on_success(job)
+        job.group_id = source_cfg.group_id
+        job.title = source_cfg.title
+        job.source_values = _get_changed_values(source_cfg)
+        job.new_logs = _get_new_logs(source_cfg)
+
+    def _load_articles(self, job):
+        source_cfg = job.source_cfg
+        websupport.reset_downloaded()
+        websupport.reset_statuses()
+        websupport.reset_download_time()
+        start = time.time()
+        try:
+            articles = list(job.articles or [])
+            _add_download_time(job, 'parse', time.time() - start)
+            if articles and source_cfg.conf.get('filter.enabled', True):
+                start = time.time()
+                articles = list(self._filter_articles(articles, job.session,
+                                                      source_cfg))
+                job.timings['filter'] = time.time() - start
+            job.articles = articles
+            job.cnt = len(articles)
+            if articles:
+                source_cfg.add_log('info', "Found new %d articles" % job.cnt)
+        except base.GetArticleException, err:
+            _LOG.error("%s Load articles from %s/%s error: %r",
+                       self._p_name, source_cfg.name, source_cfg.title,
+                       err)
+            job.error, job.retry_after = str(err), err.retry_after
+            job.articles = None
+        except Exception, err:  # pylint:disable=broad-except
+            _LOG.exception("%s Load articles from %s/%s error: %r",
+                           self._p_name, source_cfg.name, source_cfg.title,
+                           err)
+            job.error = str(err)
+            job.articles = None
+        else:
+            _LOG.debug("%s Loaded %d from %s/%s", self._p_name, job.cnt,
+                       source_cfg.name, source_cfg.title)
+        job.downloaded += websupport.reset_downloaded()
+        _add_statuses(job)
+
+    def _on_success(self, job):
+        source_cfg = job.source_cfg
+        # update configuration
+        job.force_update = bool(source_cfg.last_error) or \
+            job.last_conf_updated != source_cfg.conf_updated
+
+        intervals.record_arrival(source_cfg, job.cnt)
+        interval, reason = intervals.get_interval(source_cfg, self.aconf)
+        source_cfg.meta['interval'] = interval
+        source_cfg.meta['interval_reason'] = reason
+        if 'retry_reason' in source_cfg.meta:
+            del source_cfg.meta['retry_reason']
+        source_cfg.next_refresh = job.started + \
+            datetime.timedelta(minutes=interval)
+        source_cfg.last_refreshed = job.started
+        source_cfg.failure_counter = 0
+        source_cfg.last_error = None
+        source_cfg.last_error_date = None
+
+        # store resources in repository
+        repository = repo.Reporitory()
+        for res_name, res_content in job.source.get_resources():
+            repository.store_file(res_name, res_content)
+
+    def _load_filters(self, source_cfg):
         for fltr in source_cfg.get_filters():
             fltr_cls = plugins.FILTERS.get(fltr.name)
             if not fltr_cls:
                 _LOG.error("%s unknown filter: %s in %r", self._p_name,
                            fltr.name, fltr.oid)
-                _on_error(session, source_cfg, "unknown filter")
+                source_cfg.add_log("ERROR", "unknown filter %s" % fltr.name)
                 continue
             yield fltr_cls(fltr)
 
@@ -195,8 +476,8 @@ class Worker(threading.Thread):
                 else source_cfg.conf.get('filter.min_score', 0)
         return min_score
 
-    def _filter_articles(self, articles, session, source_cfg):
-        filters = list(self._load_filters(source_cfg, session))
+    def _filter_articles(self, articles, _session, source_cfg):
+        filters = list(self._load_filters(source_cfg))
         min_score = self._get_min_score(source_cfg)
         for article in articles:
             for ftr in filters:
@@ -209,71 +490,417 @@ class Worker(threading.Thread):
                 continue
             yield article
 
-    # pylint:disable=no-self-use
-    def _get_icon(self, source, _session, source_cfg):
-        iconname = source.get_icon()
-        if iconname and iconname[0]:
-            icon, icon_name = iconname
-            name = "_".join(('src', str(source_cfg.oid), icon_name))
-            repo.Reporitory().store_file(name, icon)
-            source_cfg.icon_id = name
 
+class WriterWorker(threading.Thread):
+    """ Writer - the only worker that store processing results in database.
 
-def _save_articls(articles, session, source_cfg):
-    for article in articles:
-        article.source_id = source_cfg.oid
-        session.merge(article)
-        yield 1
+    Results are stored in batches: up to `batch_size` jobs or jobs received
+    in `window` seconds since first one are stored in one transaction.
 
+    Arguments:
+        store_q: queue of processed jobs
+        update_q: source ids queue; task is marked done after store
+        gui_update_queue: queue for gui messages
+        batch_size: max number of jobs in one transaction
+        window: max time (sec) of waiting for jobs to batch
+    """
+
+    def __init__(self, store_q, update_q, gui_update_queue,
+                 batch_size=_WRITE_BATCH, window=_WRITE_WINDOW):
+        super(WriterWorker, self).__init__()
+        self.store_q = store_q
+        self.update_q = update_q
+        self.gui_update_queue = gui_update_queue
+        self.batch_size = max(batch_size, 1)
+        self.window = window
+        self.timings_keep = appconfig.AppConfig().get('sources.timings_keep',
+                                                      20)
+        # number of commits & stored jobs
+        self.commits = 0
+        self.stored = 0
+        self._p_name = "WriterWorker: id=%d" % id(self)
+
+    def run(self):
+        session = db.Session()
+        while True:
+            jobs, stop = self._get_batch()
+            if jobs:
+                self._store_batch(session, jobs)
+            if stop:
+                db.Session.remove()
+                return
+
+    def get_stats(self):
+        return {'commits': self.commits, 'stored': self.stored}
+
+    def _get_batch(self):
+        """ Get jobs to store in one transaction.
+
+        Return:
+            (list of jobs, stop flag)
+        """
+        job = self.store_q.get()
+        if job is None:
+            return [], True
+        jobs = [job]
+        deadline = time.time() + self.window
+        while len(jobs) < self.batch_size:
+            timeout = deadline - time.time()
+            try:
+                if timeout > 0:
+                    job = self.store_q.get(True, timeout)
+                else:
+                    job = self.store_q.get(False)
+            except Queue.Empty:
+                break
+            if job is None:
+                return jobs, True
+            jobs.append(job)
+        return jobs, False
+
+    def _store_batch(self, session, jobs):
+        try:
+            for job in jobs:
+                self._store(session, job)
+            session.commit()
+        except Exception, err:  # pylint:disable=broad-except
+            session.rollback()
+            if len(jobs) > 1:
+                # find failing job
+                _LOG.warn("%s store batch error: %r; storing separately",
+                          self._p_name, err)
+                for job in jobs:
+                    self._store_batch(session, [job])
+                return
+            job = jobs[0]
+            _LOG.exception("%s store %r error: %r", self._p_name,
+                           job.source_id, err)
+            self._on_store_error(session, job, err)
+            self._finish(session, job)
+            return
+        self.commits += 1
+        self.stored += len(jobs)
+        _LOG.debug("%s stored %d jobs", self._p_name, len(jobs))
+        for job in jobs:
+            self._after_store(session, job)
+            self._finish(session, job)
+
+    def _on_store_error(self, session, job, err):
+        """ Mark source as failed after store error; next refresh is
+        postponed like after fetch errors. """
+        job.error = "Store error: %s" % err
+        try:
+            _on_error(db.get_one(DBO.Source, session=session,
+                                 oid=job.source_id), job.error)
+            session.commit()
+        except Exception, err:  # pylint:disable=broad-except
+            _LOG.exception("%s store %r error state error: %r",
+                           self._p_name, job.source_id, err)
+            session.rollback()
+        self._after_store(session, job)
 
-def _on_error(session, source_cfg, error_msg):
-    """ Save processing errors to database. """
+    def _finish(self, session, job):
+        _finish_processing(session, job.source_id)
+        self.update_q.task_done()
+
+    def _store(self, session, job):
+        if job.skipped:
+            return
+        source_id = job.source_id
+        start = time.time()
+        if job.source_values:
+            session.query(DBO.Source).filter(DBO.Source.oid == source_id).\
+                update(job.source_values, synchronize_session=False)
+        for log in job.new_logs or []:
+            log.source_id = source_id
+            session.add(log)
+        if job.articles:
+            db.bulk_save_articles(session, source_id, job.articles)
+        now = time.time()
+        job.timings['store'] = now - start
+        job.timings['total'] = now - job.started_ts
+        timings.add_timing(session, source_id, job.timings, job.downloaded,
+                           job.cnt, job.error is not None, self.timings_keep,
+                           job.modified, job.not_modified, job.unchanged,
+                           job.cached)
+
+    def _after_store(self, session, job):
+        # source may be disabled or deleted by user during processing
+        source = session.query(DBO.Source.enabled, DBO.Source.deleted,
+                               DBO.Source.next_refresh).\
+            filter(DBO.Source.oid == job.source_id).first()
+        if source and source.enabled and not source.deleted:
+            SCHEDULER.schedule(job.source_id,
+                               job.reschedule_at or source.next_refresh)
+        else:
+            SCHEDULER.remove(job.source_id)
+        if job.error is not None:
+            self.gui_update_queue.put(
+                ('source_update_error', (job.source_id, job.group_id,
+                                         job.title or str(job.source_id))))
+        else:
+            self.gui_update_queue.put(
+                ('source_update', (job.source_id, job.group_id, job.title,
+                                   job.cnt, job.force_update)))
+        _LOG.debug("%s src=%d finished; timings: %s; downloaded: %d",
+                   self._p_name, job.source_id,
+                   ", ".join("%s=%.3f" % item for item
+                             in sorted(job.timings.iteritems())),
+                   job.downloaded)
+
+
+def _add_download_time(job, stage, elapsed):
+    """ Set `stage` time without time of downloading in current thread;
+    add download time to `job` "download" stage. """
+    download_time = websupport.reset_download_time()
+    job.timings['download'] = job.timings.get('download', 0) + download_time
+    job.timings[stage] = max(elapsed - download_time, 0)
+
+
+def _add_statuses(job):
+    """ Add responses counted by websupport in current thread to `job`. """
+    modified, not_modified, cached = websupport.reset_statuses()
+    job.modified += modified
+    job.not_modified += not_modified
+    job.cached += cached
+
+
+def _get_changed_values(source_cfg):
+    """ Get dict of modified `source_cfg` attributes. """
+    values = {}
+    for attr in _SOURCE_UPDATED_ATTRS:
+        if orm.attributes.get_history(source_cfg, attr).has_changes():
+            values[attr] = getattr(source_cfg, attr)
+    return values
+
+
+def _get_new_logs(source_cfg):
+    """ Get not stored log entries added to `source_cfg`; detach them from
+    source. """
+    if 'source_log' not in source_cfg.__dict__:
+        # logs not loaded so nothing was added
+        return []
+    logs = []
+    for log in source_cfg.source_log:
+        if log.oid is None:
+            logs.append(DBO.SourceLog(date=log.date, category=log.category,
+                                      message=log.message))
+    return logs
+
+
+def _on_error(source_cfg, error_msg, retry_after=None):
+    """ Update source state after processing error; postpone next refresh.
+    """
     if not source_cfg:
         return
     now = datetime.datetime.now()
     aconf = appconfig.AppConfig()
-    source_cfg.processing = 0
     source_cfg.last_error = error_msg
     source_cfg.last_error_date = now
-    source_cfg.failure_counter += 1
+    source_cfg.failure_counter = (source_cfg.failure_counter or 0) + 1
     max_faulures = aconf.get('sources.max_faulures')
     if max_faulures and source_cfg.failure_counter == max_faulures:
         source_cfg.enabled = False
         source_cfg.add_log('info', "Source disabled due max failures occurred")
-    interval = source_cfg.interval or aconf.get('articles.update_interval', 60)
-    source_cfg.next_refresh = now + datetime.timedelta(minutes=interval)
+    delay, reason = intervals.get_retry_delay(source_cfg, retry_after, aconf)
+    source_cfg.next_refresh = now + datetime.timedelta(minutes=delay)
+    if source_cfg.meta is None:
+        source_cfg.meta = {}
+    source_cfg.meta['retry_reason'] = reason
+    # content must be parsed again on next refresh
+    if 'content_digest' in source_cfg.meta:
+        del source_cfg.meta['content_digest']
     # source_cfg.last_refreshed = now
     source_cfg.add_log("ERROR", error_msg)
-    session.commit()
 
 
-def _emit_updated(source_oid, group_oid, source_title, new_articles_cnt,
-                  force=False):
-    """ Inform application about source updates. """
-    if new_articles_cnt or force:
-        messenger.MESSENGER.emit_source_updated(source_oid, group_oid)
-    if new_articles_cnt:
-        messenger.MESSENGER.emit_announce(
-            u"%s updated - %d new articles" % (source_title, new_articles_cnt))
-    else:
-        messenger.MESSENGER.emit_announce(u"%s updated" % source_title)
-        messenger.MESSENGER.emit_updating_status(
-            messenger.ST_UPDATE_SOURCE_FINISHED, source_oid)
+def get_workers_count(aconf=None):
+    """ Get number of workers for engine configured by `workers.engine`.
+
+    Engines:
+        threads - fixed, small pool of workers (default)
+        concurrent - large pool (`workers.concurrency`) of lightweight
+            workers; keep many requests in flight
+    """
+    aconf = aconf or appconfig.AppConfig()
+    engine = aconf.get('workers.engine', 'threads')
+    if engine == 'concurrent':
+        return max(aconf.get('workers.concurrency', _CONCURRENCY), 1)
+    if engine != 'threads':
+        _LOG.warn("get_workers_count: unknown engine %r; using threads",
+                  engine)
+    return _WORKERS
+
 
+class UpdatePipeline(object):
+    """ Fetch, parse and store workers processing sources from `update_q`.
 
-def _process_sources(update_q):
+    Args:
+        update_q: queue of source ids
+        gui_update_q: queue for gui messages
+    """
+
+    def __init__(self, update_q, gui_update_q):
+        self.update_q = update_q
+        self.gui_update_q = gui_update_q
+        self.terminate_event = threading.Event()
+        self.parse_q = None
+        self.store_q = None
+        self.fetch_wkrs = []
+        self.parse_wkrs = []
+        self.writer_wkr = None
+        self.watchdog = None
+        self.stop_timeout = _STOP_TIMEOUT
+        self._stack_size = None
+
+    def start(self, aconf=None):
+        aconf = aconf or appconfig.AppConfig()
+        queue_size = aconf.get('workers.queue_size', _QUEUE_SIZE)
+        self.parse_q = StageQueue('parse', queue_size)
+        self.store_q = StageQueue('store', queue_size)
+        self.writer_wkr = WriterWorker(
+            self.store_q, self.update_q, self.gui_update_q,
+            aconf.get('workers.write_batch', _WRITE_BATCH),
+            aconf.get('workers.write_window', _WRITE_WINDOW))
+        self.writer_wkr.daemon = True
+        self.writer_wkr.start()
+        parsers = max(aconf.get('workers.parse_threads', _PARSERS), 1)
+        for _dummy in xrange(parsers):
+            self.parse_wkrs.append(self._start_parse_worker())
+        count = get_workers_count(aconf)
+        # reduce memory used by many threads
+        self._stack_size = _WORKER_STACK_SIZE if count > _WORKERS else None
+        for _dummy in xrange(count):
+            self.fetch_wkrs.append(self._start_fetch_worker())
+        self.stop_timeout = aconf.get('workers.stop_timeout', _STOP_TIMEOUT)
+        self.watchdog = WorkerWatchdog(
+            self, aconf.get('workers.source_timeout', _SOURCE_TIMEOUT))
+        self.watchdog.start()
+        _LOG.debug("UpdatePipeline.start: fetch=%d parse=%d", count,
+                   len(self.parse_wkrs))
+
+    def _start_fetch_worker(self):
+        prev_stack_size = None
+        if self._stack_size:
+            prev_stack_size = threading.stack_size(self._stack_size)
+        try:
+            wkr = Worker(self.update_q, self.parse_q, self.terminate_event,
+                         self.gui_update_q)
+            wkr.daemon = True
+            wkr.start()
+        finally:
+            if prev_stack_size is not None:
+                threading.stack_size(prev_stack_size)
+        return wkr
+
+    def _start_parse_worker(self):
+        wkr = ParseWorker(self.parse_q, self.store_q)
+        wkr.daemon = True
+        wkr.start()
+        return wkr
+
+    def abandon_worker(self, wkr, source_id, elapsed):
+        """ Abandon fetch or parse worker `wkr` that process `source_id` too
+        long; pass timeout error to parse stage and start new worker. """
+        _LOG.warn("UpdatePipeline.abandon_worker: source %r processed for "
+                  "%d s by %r", source_id, elapsed, wkr)
+        if isinstance(wkr, ParseWorker):
+            self.parse_wkrs = [pwkr for pwkr in self.parse_wkrs
+                               if pwkr != wkr]
+            self.parse_wkrs.append(self._start_parse_worker())
+        else:
+            self.fetch_wkrs = [fwkr for fwkr in self.fetch_wkrs
+                               if fwkr != wkr]
+            self.fetch_wkrs.append(self._start_fetch_worker())
+        job = _Job(source_id)
+        job.timed_out = True
+        job.error = "Source processing timeout (%d s)" % elapsed
+        self.parse_q.put(job)
+
+    def stop(self, deadline=None):
+        """ Stop workers; wait for processing sources up to `deadline`
+        (timestamp; default `stop_timeout` seconds from now). """
+        self.terminate_event.set()
+        if deadline is None:
+            deadline = time.time() + self.stop_timeout
+        for _dummy in self.fetch_wkrs:
+            self.update_q.put(None)
+        _LOG.debug("UpdatePipeline.stop joining queue")
+        if not _join_queue(self.update_q, deadline):
+            _LOG.warn("UpdatePipeline.stop: timeout; %d sources not "
+                      "finished", self.update_q.unfinished_tasks)
+        try:
+            for _dummy in self.parse_wkrs:
+                self.parse_q.put(None, True, max(deadline - time.time(), 0.1))
+            self.store_q.put(None, True, max(deadline - time.time(), 0.1))
+        except Queue.Full:
+            _LOG.warn("UpdatePipeline.stop: timeout; parse or store queue "
+                      "full")
+            return
+        # wait for writer to store processed sources
+        self.writer_wkr.join(max(deadline - time.time(), 0.1))
+
+    def get_stats(self):
+        """ Get stats for queues between stages and writer. """
+        if self.writer_wkr is None:
+            return {}
+        return {'update': {'depth': self.update_q.qsize()},
+                'parse': self.parse_q.get_stats(),
+                'store': self.store_q.get_stats(),
+                'writer': self.writer_wkr.get_stats(),
+                'abandoned': self.watchdog.abandoned,
+                'http': websupport.get_stats()}
+
+
+def _join_queue(queue, deadline):
+    """ Wait until all tasks in `queue` are done or `deadline` (timestamp).
+    Return True when all tasks are done. """
+    with queue.all_tasks_done:
+        while queue.unfinished_tasks:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            queue.all_tasks_done.wait(remaining)
+    return True
+
+
+class WorkerWatchdog(threading.Thread):
+    """ Worker: find fetch and parse workers that process one source longer
+    than `timeout` seconds and abandon them (source is marked as failed, new
+    worker is started in place of stuck one). """
+
+    def __init__(self, pipeline, timeout):
+        super(WorkerWatchdog, self).__init__()
+        self.daemon = True
+        self.pipeline = pipeline
+        self.timeout = timeout
+        self.abandoned = 0
+
+    def run(self):
+        interval = max(min(self.timeout / 4.0, 30), 1)
+        terminate_event = self.pipeline.terminate_event
+        while not terminate_event.is_set():
+            terminate_event.wait(interval)
+            self.check()
+
+    def check(self):
+        now = time.time()
+        for wkr in self.pipeline.fetch_wkrs + self.pipeline.parse_wkrs:
+            with wkr.state_lock:
+                if not wkr.current or wkr.abandoned:
+                    continue
+                source_id, start = wkr.current
+                if now - start < self.timeout:
+                    continue
+                wkr.abandoned = True
+            self.abandoned += 1
+            self.pipeline.abandon_worker(wkr, source_id, now - start)
+
+
+def _process_sources(update_q, gui_update_q):
     """ Process all sources with `next_refresh` date in past """
     _LOG.debug("MainWorker: start processing")
-    session = db.Session()
-    now = datetime.datetime.now()
-    query = session.query(DBO.Source).\
-        filter(DBO.Source.enabled == 1,
-               DBO.Source.next_refresh < now,
-               DBO.Source.deleted == None).\
-        order_by(DBO.Source.next_refresh)
-    sources = [src.oid for src in query]
-    session.expunge_all()
-    session.close()
+    sources = SCHEDULER.pop_due()
     new_sources = []
     if len(sources) > 0:
         with update_q.mutex:
@@ -286,9 +913,7 @@ def _process_sources(update_q):
                 _LOG.debug('_process_sources: add %d', source_id)
                 update_q.put(source_id)
 
-            messenger.MESSENGER.emit_announce(u"Starting sources update")
-            messenger.MESSENGER.emit_updating_status(
-                messenger.ST_UPDATE_STARTED, len(new_sources))
+            gui_update_q.put(('update_started', len(new_sources)))
 
             with update_q.all_tasks_done:
                 unfinished_tasks_cnt = update_q.unfinished_tasks
@@ -299,20 +924,26 @@ def _process_sources(update_q):
 
 
 class WorkerDbCheck(threading.Thread):
-    """ Worker: check sources for updating. """
+    """ Worker: put sources due to refresh (according to scheduler) into
+    update queue. Sleep until next deadline or command. """
 
-    def __init__(self, update_q):
+    def __init__(self, update_q, gui_update_q):
         super(WorkerDbCheck, self).__init__()
         self.daemon = True
         self.update_q = update_q
+        self.gui_update_q = gui_update_q
         self.command_q = Queue.Queue()
         self._enable_flag = threading.Event()
+        SCHEDULER.listener = self.wakeup
 
     def run(self):
         _LOG.info("Starting worker")
         while True:
+            timeout = SCHEDULER.get_wait_time() \
+                if self._enable_flag.is_set() else None
+            _LOG.debug("WorkerDbCheck.run sleep %r", timeout)
             try:
-                cmd = self.command_q.get(True, _LONG_SLEEP)
+                cmd = self.command_q.get(True, timeout)
             except Queue.Empty:
                 pass
             else:
@@ -322,71 +953,83 @@ class WorkerDbCheck(threading.Thread):
             if not self._enable_flag.is_set():
                 _LOG.debug('WorkerDbCheck.run _enable_flag not set')
                 continue
-            while _process_sources(self.update_q):
+            while _process_sources(self.update_q, self.gui_update_q):
                 self.update_q.join()
-                messenger.MESSENGER.emit_announce(u"Update finished")
-                messenger.MESSENGER.emit_updating_status(
-                    messenger.ST_UPDATE_FINISHED)
+                self.gui_update_q.put(('update_finished', None))
             _LOG.debug("WorkerDbCheck.run loop finished")
 
     def enable_updates(self, enable):
         """ Enable/disable thread processing """
         if enable:
             self._enable_flag.set()
+            self.wakeup()
         else:
             self._enable_flag.clear()
 
+    def wakeup(self):
+        """ Wake up thread to recalculate sleep time. """
+        if self.command_q.empty():
+            self.command_q.put('start')
+
 
 class WorkerGuiUpdate(threading.Thread):
-    """ Worker: periodically check for message queue and generate
-    gui-related events. """
+    """ Worker: periodically check for message queue and pass events to
+    `sink` (by default - to gui by Qt messenger). """
 
-    def __init__(self, messages_queue):
+    def __init__(self, messages_queue, sink=None, window=_GUI_UPDATE_WINDOW):
         super(WorkerGuiUpdate, self).__init__()
         self.daemon = True
         self.messages_queue = messages_queue
+        self.sink = sink or sinks.QtSink()
+        # events are collected by sink and sent every `window` seconds
+        self.window = window
 
     def run(self):
         _LOG.info("WorkerGuiUpdate: starting")
+        sink = self.sink
+        next_flush = time.time() + self.window
         while True:
-            cmd = self.messages_queue.get()
+            try:
+                cmd = self.messages_queue.get(
+                    True, max(next_flush - time.time(), 0.01))
+            except Queue.Empty:
+                cmd = ()
+            if time.time() >= next_flush or cmd is None:
+                sink.flush()
+                next_flush = time.time() + self.window
             if cmd is None:
                 return
+            if not cmd:
+                continue
             _LOG.debug("WorkerGuiUpdate: cmd %r", cmd)
             cmd, args = cmd
             if cmd == 'update_finished':
-                messenger.MESSENGER.emit_announce(u"Update finished")
-                messenger.MESSENGER.emit_updating_status(
-                    messenger.ST_UPDATE_FINISHED)
+                sink.update_finished()
+            elif cmd == 'update_started':
+                sink.update_started(args)
             elif cmd == 'source_update':
-                _emit_updated(*args)  # pylint: disable=star-args
-                messenger.MESSENGER.emit_updating_status(
-                    messenger.ST_UPDATE_PING)
+                sink.source_updated(*args)  # pylint: disable=star-args
             elif cmd == 'source_update_error':
-                _source_oid, _group_oid, source_title = args
-                messenger.MESSENGER.emit_announce(
-                    u"%s updated - update error" % source_title)
-                messenger.MESSENGER.emit_updating_status(
-                    messenger.ST_UPDATE_PING)
+                sink.source_update_error(*args)  # pylint: disable=star-args
             elif cmd == 'source_updating_start':
-                messenger.MESSENGER.emit_updating_status(
-                    messenger.ST_UPDATE_SOURCE_START, args)
+                sink.source_updating_start(args)
         _LOG.debug("WorkerGuiUpdate: exit")
 
 
 class WorkerStatus(threading.Thread):
-    def __init__(self, messages_queue, workers):
+    """ Worker: periodically log pipeline queues stats. """
+
+    def __init__(self, messages_queue, pipeline):
         super(WorkerStatus, self).__init__()
         self.messages_queue = messages_queue
-        self.workers = workers
+        self.pipeline = pipeline
         self.daemon = True
 
     def run(self):
         while True:
-            _LOG.info('WorkerStatus: %r, %r, %r, %r',
+            _LOG.info('WorkerStatus: gui=%r, %r',
                       self.messages_queue.qsize(),
-                      _STARTED.qsize(), _ENDED.qsize(),
-                      [thr.is_alive() for thr in self.workers])
+                      self.pipeline.get_stats())
             time.sleep(5)
 
 
@@ -408,71 +1051,119 @@ def _debug_not_ended_src():
 
 class BgJobsManager(object):
     def __init__(self):
-        # stop all background process
-        self._src_update_wrks_terminate = threading.Event()
+        # queue for updating gui events
+        self._gui_update_q = Queue.Queue()
         self._src_update_q = Queue.Queue()
-        self._src_update_wkrs = []
+        # workers processing sources from _src_update_q
+        self._pipeline = UpdatePipeline(self._src_update_q,
+                                        self._gui_update_q)
         # background worker that periodically check database for sources to
         # update and put its id to _src_update_q
         self._db_check_wkr = None
-        # queue for updating gui events
-        self._gui_update_q = Queue.Queue()
         # worker that generating events from _gui_update_q queue
         self._gui_update_wkr = None
 
-    def start_workers(self):
+    def start_processes(self):  # pylint:disable=no-self-use
+        """ Start parsing processes (`workers.parse_processes`).
+
+        Processes are forked, so this should be called before any thread
+        (and Qt application) is started; otherwise children may inherit locks
+        held by other threads. Called also by `start_workers` when pool is
+        not started yet.
+        """
+        procpool.start(appconfig.AppConfig().get('workers.parse_processes',
+                                                 0))
+
+    def start_workers(self, sink=None, db_check=True):
+        """ Start background workers.
+
+        Args:
+            sink: receiver of update events (default: `sinks.QtSink`)
+            db_check: start worker that periodically put sources to update
+        """
         _LOG.info("BgJobsManager.start_workers")
+        # fork processes before starting any thread
+        self.start_processes()
 
-        self._gui_update_wkr = WorkerGuiUpdate(self._gui_update_q)
+        self._gui_update_wkr = WorkerGuiUpdate(
+            self._gui_update_q, sink,
+            appconfig.AppConfig().get('workers.gui_update_window',
+                                      _GUI_UPDATE_WINDOW))
         self._gui_update_wkr.start()
 
-        for _dummy in xrange(_WORKERS):
-            wkr = Worker(self._src_update_q, self._src_update_wrks_terminate,
-                         self._gui_update_q)
-            wkr.daemon = True
-            wkr.start()
-            self._src_update_wkrs.append(wkr)
+        aconf = appconfig.AppConfig()
+        websupport.configure(aconf.get('http.host_limit', 8),
+                             aconf.get('http.pool_hosts', 50),
+                             aconf.get('http.connect_timeout', 10),
+                             aconf.get('http.read_timeout', 30),
+                             aconf.get('http.max_size', 10485760))
+        websupport.configure_cache(
+            os.path.join(aconf.user_cache_dir, 'http'),
+            aconf.get('http.cache_size', 52428800),
+            aconf.get('http.cache_fresh_time', 60))
+        self._pipeline.start()
 
-        # wkr = WorkerStatus(self._src_update_q, self._src_update_wkrs)
-        # wkr.start()
+        if aconf.debug:
+            wkr = WorkerStatus(self._gui_update_q, self._pipeline)
+            wkr.start()
 
-        self._db_check_wkr = WorkerDbCheck(self._src_update_q)
-        self._db_check_wkr.start()
+        SCHEDULER.load()
+        if db_check:
+            self._db_check_wkr = WorkerDbCheck(self._src_update_q,
+                                               self._gui_update_q)
+            self._db_check_wkr.start()
+            self._db_check_wkr.enable_updates(True)
+        _LOG.debug("BgJobsManager.start_workers done")
 
-        self._db_check_wkr.enable_updates(True)
-        _LOG.debug("BgJobsManager.start_workers done %d",
-                   len(self._src_update_wkrs))
+    def update_once(self, sink=None):
+        """ Update all sources due to refresh and stop workers. """
+        _LOG.info("BgJobsManager.update_once")
+        self.start_workers(sink, db_check=False)
+        if _process_sources(self._src_update_q, self._gui_update_q):
+            self._src_update_q.join()
+        self._gui_update_q.put(('update_finished', None))
+        self.stop_workers()
+        # wait for all events
+        self._gui_update_wkr.join()
+        _LOG.debug("BgJobsManager.update_once done")
 
     def stop_workers(self):
         _LOG.info("BgJobsManager.stop_workers")
-        self._db_check_wkr.command_q.put('exit')
+        if self._db_check_wkr is not None:
+            self._db_check_wkr.command_q.put('exit')
         self._gui_update_q.put(None)
-        self._src_update_wrks_terminate.set()
         self.empty_queue()
-        for _dummy in xrange(_WORKERS):
-            self._src_update_q.put(None)
 
         # _debug_not_ended_src()
 
-        time.sleep(3)
-        for wkr in self._src_update_wkrs:
-            if wkr.is_alive():
-                wkr.terminate()
-        _LOG.debug("BgJobsManager.stop_workers joining queue")
-        self._src_update_q.join()
+        # pipeline and process pool share one stop timeout
+        deadline = time.time() + self._pipeline.stop_timeout
+        self._pipeline.stop(deadline)
+        procpool.stop(max(deadline - time.time(), 0))
         _LOG.debug("BgJobsManager.stop_workers done")
 
     def empty_queue(self):
         _LOG.info("BgJobsManager.empty_queue")
+        removed = []
         try:
             while True:
                 itm = self._src_update_q.get(False)
                 _LOG.debug("empty_queue: found %r", itm)
+                if itm is not None:
+                    removed.append(itm)
                 self._src_update_q.task_done()
         except Queue.Empty:
             pass
+        # postpone canceled sources to next regular refresh
+        next_refresh = datetime.datetime.now() + datetime.timedelta(
+            minutes=appconfig.AppConfig().get('articles.update_interval', 60))
+        SCHEDULER.schedule_all((oid, next_refresh) for oid in removed)
         _LOG.debug("BgJobsManager.empty_queue done")
 
+    def get_stats(self):
+        """ Get update pipeline stats. """
+        return self._pipeline.get_stats()
+
     def is_updating(self):
         with self._src_update_q.all_tasks_done:
             return bool(self._src_update_q.unfinished_tasks)
@@ -15,12 +15,18 @@ import sys
 import optparse
 import logging
 import socket
+import signal
+import threading
 
 socket.setdefaulttimeout(30)
 _LOG = logging.getLogger(__name__)
 
-import sip
-sip.setapi("QString", 2)  # pylint:disable=no-member
+try:
+    import sip
+    sip.setapi("QString", 2)  # pylint:disable=no-member
+except ImportError:
+    # PyQt is not required in headless modes
+    sip = None
 
 
 from mna import version
@@ -29,6 +35,17 @@ from mna import version
 def _parse_opt():
     """ Parse cli options. """
     optp = optparse.OptionParser(version=version.NAME + version.VERSION)
+    group = optparse.OptionGroup(optp, "Headless modes (without gui)")
+    group.add_option("--update-once", action="store_true", default=False,
+                     help="update all sources due to refresh and exit")
+    group.add_option("--daemon", action="store_true", default=False,
+                     help="run background updates until interrupted")
+    group.add_option("--quiet", "-q", action="store_true", default=False,
+                     help="do not print progress on stdout")
+    group.add_option("--report-slowest", type="int", metavar="NUM",
+                     help="print NUM sources with the longest refresh time "
+                     "and exit")
+    optp.add_option_group(group)
     group = optparse.OptionGroup(optp, "Debug options")
     group.add_option("--debug", "-d", action="store_true", default=False,
                      help="enable debug messages")
@@ -79,6 +96,67 @@ def run():
         app.start()
         return
 
+    if options.report_slowest:
+        _report_slowest(options.report_slowest)
+        return
+
+    if options.update_once or options.daemon:
+        _run_headless(options)
+    else:
+        _run_gui()
+
+    # cleanup
+    from mna.logic import articles
+    articles.delete_old_articles()
+
+    config.save()
+
+
+def _run_headless(options):
+    """ Run updates without gui; report progress to log/stdout. """
+    from mna.logic import worker
+    from mna.logic import sinks
+    worker.BG_JOBS_MNGR.start_processes()
+    sink = sinks.LogSink(None if options.quiet else sys.stdout)
+    if options.update_once:
+        worker.BG_JOBS_MNGR.update_once(sink)
+        return
+
+    stop = threading.Event()
+
+    def _on_signal(_signum, _frame):
+        stop.set()
+
+    signal.signal(signal.SIGTERM, _on_signal)
+    signal.signal(signal.SIGINT, _on_signal)
+    worker.BG_JOBS_MNGR.start_workers(sink)
+    _LOG.info("daemon started")
+    while not stop.is_set():
+        # wait with timeout allow to handle signals
+        stop.wait(1)
+    _LOG.info("daemon stopping")
+    worker.BG_JOBS_MNGR.stop_workers()
+
+
+def _report_slowest(limit):
+    """ Print sources with the longest refresh time. """
+    from mna.logic import timings
+    print "%-40s %6s %8s %8s %8s %8s %10s %6s" % (
+        "Source", "Runs", "p50 ms", "p95 ms", "dload95", "fetch95",
+        "bytes p50", "Errors")
+    for title, runs, p50, p95, download95, fetch95, bytes50, errors in \
+            timings.get_slowest_sources(limit):
+        print "%-40s %6d %8d %8d %8d %8d %10d %6d" % (
+            title[:40].encode('utf-8', 'replace'), runs, p50, p95,
+            download95, fetch95, bytes50, errors)
+
+
+def _run_gui():
+    """ Run gui application with background updates. """
+    from mna.logic import worker
+    # parsing processes must be forked before Qt application is created
+    worker.BG_JOBS_MNGR.start_processes()
+
     from PyQt4 import QtGui
     app = QtGui.QApplication(sys.argv)  # pylint:disable=no-member
 
@@ -87,15 +165,8 @@ def run():
     window = wnd_main.WndMain()
     window.show()  # pylint:disable=no-member
 
-    from mna.logic import worker
     worker.BG_JOBS_MNGR.start_workers()
 
     app.exec_()
 
     worker.BG_JOBS_MNGR.stop_workers()
-
-    # cleanup
-    from mna.logic import articles
-    articles.delete_old_articles()
-
-    config.save()
@@ -16,8 +16,11 @@ __version__ = "2015-01-17"
 import logging
 import itertools
 import datetime
+import hashlib
+import importlib
 
 from mna.lib import appconfig
+from mna.lib import websupport
 
 _LOG = logging.getLogger(__name__)
 
@@ -99,13 +102,30 @@ class SimplePresenter(object):  # pylint:disable=too-few-public-methods
                    + r"</p></article>")
 
 
+class LazyClass(object):  # pylint:disable=too-few-public-methods
+    """ Class attribute resolved to class `name` ("package.module.Class") on
+    first access; allow plugins to refer gui classes without importing Qt.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._class = None
+
+    def __get__(self, instance, owner):
+        if self._class is None:
+            module, _dot, class_name = self._name.rpartition('.')
+            self._class = getattr(importlib.import_module(module),
+                                  class_name)
+        return self._class
+
+
 class AbstractSource(object):
     """Basic source"""
 
     # Human readable name
     name = "dummy"
     presenter = SimplePresenter
-    # subclass of QFrame
+    # subclass of QFrame (or `LazyClass`)
     conf_panel_class = None
     # default icon for sources this type
     default_icon = "unknown"
@@ -120,6 +140,9 @@ class AbstractSource(object):
         self._now = datetime.datetime.now()  # starting, base date
         if not self.cfg.meta:
             self.cfg.meta = {}
+        # downloaded content was identical to previous one; set by
+        # `_is_content_unchanged`
+        self.content_unchanged = False
 
     # pylint:disable=unused-argument,no-self-use
     def get_items(self, session=None, max_load=-1, max_age_load=-1):
@@ -172,6 +195,47 @@ class AbstractSource(object):
         if __debug__:
             self.cfg.add_log('debug', message % args)
 
+    def _download(self, url, etag=None, modified=None):
+        """ Download page by `websupport.download_page` with conditional
+        request validators kept per url in source meta ("validators").
+
+        Args:
+            url: page url
+            etag, modified: validators used when none are stored for `url`
+        """
+        validators = dict(self.cfg.meta.get('validators') or {})
+        result = websupport.download_page(url, etag, modified,
+                                          validators=validators)
+        if validators != self.cfg.meta.get('validators'):
+            self.cfg.meta['validators'] = validators
+        return result
+
+    def _is_content_unchanged(self, content):
+        """ Check is `content` identical to content downloaded in previous
+        refresh (with the same configuration); remember its digest. """
+        digest = hashlib.sha1(content)
+        digest.update(repr(sorted((self.cfg.conf or {}).iteritems())))
+        digest.update(repr(self._get_load_settings()))
+        digest = digest.hexdigest()
+        if self.cfg.meta.get('content_digest') == digest:
+            self.content_unchanged = True
+            return True
+        self.cfg.meta['content_digest'] = digest
+        return False
+
+    def _get_load_settings(self):
+        """ Get settings that affect articles loaded from content: load
+        limits and filters. """
+        aconf = appconfig.AppConfig()
+        filters = sorted((fltr.name, fltr.enabled,
+                          sorted((fltr.conf or {}).iteritems()))
+                         for fltr in self.cfg.get_filters())
+        return (aconf.get('articles.max_num_load', 0),
+                aconf.get('articles.max_age_load', 0),
+                aconf.get('filter.min_score', 0),
+                self.cfg.max_articles_to_load, self.cfg.max_age_to_load,
+                filters)
+
     @classmethod
     def update_configuration(cls, source_conf, session=None):
         """ Update `source_conf` with default source parameters.
@@ -191,6 +255,10 @@ class AbstractSource(object):
                 (self.cfg.max_articles_to_load == 0 and max_load > 0):
             max_articles_to_load = self.cfg.max_articles_to_load or max_load
             articles = list(articles)
+            if len(articles) > max_articles_to_load:
+                # not all articles loaded; content must be parsed again
+                # on next refresh
+                self.cfg.meta.pop('content_digest', None)
             return articles[-max_articles_to_load:]
         return articles
 
@@ -249,8 +317,16 @@ class AbstractFilter(object):
 
 
 class GetArticleException(Exception):
-    """ General refresh source error. """
-    pass
+    """ General refresh source error.
+
+    Args:
+        message: error message
+        retry_after: optional number of seconds to wait before next try
+    """
+
+    def __init__(self, message, retry_after=None):
+        super(GetArticleException, self).__init__(message)
+        self.retry_after = retry_after
 
 
 class AbstractTool(object):
@@ -18,6 +18,7 @@ import time
 import sqlite3
 import logging
 import datetime
+import itertools
 
 import sqlalchemy
 from sqlalchemy.engine import Engine
@@ -33,6 +34,10 @@ Session = orm.scoped_session(
     orm.sessionmaker(autocommit=False,
                      autoflush=False))  # pylint: disable=C0103
 _CURRENT_SCHEMA_VER = 2
+# max number of sql variables in one query (sqlite limit is 999)
+_IN_CHUNK = 500
+# engine created by `connect`
+_ENGINE = None
 
 
 def text_factory(text):
@@ -59,6 +64,7 @@ def connect(filename, debug=False, *args, **kwargs):
     Return:
         Sqlalchemy Session class
     """
+    global _ENGINE  # pylint: disable=global-statement
     _LOG.info('connect %r', (filename, args, kwargs))
     args = {'detect_types': sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
             'check_same_thread': False}
@@ -77,6 +83,7 @@ def connect(filename, debug=False, *args, **kwargs):
     sqls.add_source_conf_updated(engine)
     sqls.update_schema(engine, _CURRENT_SCHEMA_VER)
     Session.configure(bind=engine)  # pylint: disable=E1120
+    _ENGINE = engine
 
     if debug:
         @sqlalchemy.event.listens_for(Engine, "before_cursor_execute")
@@ -118,6 +125,23 @@ def connect(filename, debug=False, *args, **kwargs):
     return Session
 
 
+def create_session():
+    """ Create new session with own connection.
+
+    Unlike `Session` (one per thread) this session may be passed between
+    threads (but must not be used concurrently). Should be closed by
+    `close_session`.
+    """
+    return Session.session_factory(bind=_ENGINE.connect())
+
+
+def close_session(session):
+    """ Close session created by `create_session` and its connection. """
+    conn = session.bind
+    session.close()
+    conn.close()
+
+
 def find_db_file(config):
     """ Find existing database file. """
 
@@ -295,3 +319,90 @@ def exists(clazz, session=None, **kwargs):
         return session.query(func.count(clazz.oid)).\
             filter_by(**kwargs).scalar() > 0
     return session.query(clazz).filter_by(**kwargs).count() > 0
+
+
+def _article_values(article):
+    """ Get values of loaded/set columns of `article` (without loading
+    anything from database). None values of columns with default are
+    skipped, so defaults are applied like in orm. """
+    values = orm.attributes.instance_state(article).dict
+    return dict((column.key, values[column.key]) for column
+                in DBO.Article.__table__.columns
+                if column.key != 'oid' and column.key in values and
+                (values[column.key] is not None or
+                 (column.default is None and column.server_default is None)))
+
+
+def _executemany_grouped(session, stmt_factory, rows):
+    """ Execute statements for `rows` grouped by set of keys (executemany
+    require the same keys in all rows). """
+    def keyfunc(row):
+        return tuple(sorted(row.iterkeys()))
+
+    for keys, group in itertools.groupby(sorted(rows, key=keyfunc),
+                                         keyfunc):
+        session.execute(stmt_factory(keys), list(group))
+
+
+def bulk_save_articles(session, source_id, articles):
+    """ Save `articles` of source `source_id` with core-level executemany
+    INSERT (new articles) and UPDATE (existing; matched by
+    (source_id, internal_id)) instead of `session.merge` for each article.
+
+    Args:
+        session: sqlalchemy session
+        source_id: articles source id
+        articles: list of Article objects (not changed)
+
+    Return:
+        number of saved articles
+    """
+    # last article with given internal_id wins; articles without
+    # internal_id are always inserted
+    values = {}
+    to_insert = []
+    for article in articles:
+        row = _article_values(article)
+        row['source_id'] = source_id
+        if row.get('internal_id') is None:
+            to_insert.append(row)
+        else:
+            values[row['internal_id']] = row
+    if not values and not to_insert:
+        return 0
+    table = DBO.Article.__table__
+    existing = set()
+    internal_ids = values.keys()
+    for idx in xrange(0, len(internal_ids), _IN_CHUNK):
+        chunk = internal_ids[idx:idx + _IN_CHUNK]
+        existing.update(iid for iid, in session.execute(
+            sqlalchemy.select([table.c.internal_id]).where(sqlalchemy.and_(
+                table.c.source_id == source_id,
+                table.c.internal_id.in_(chunk)))))
+    to_insert.extend(row for iid, row in values.iteritems()
+                     if iid not in existing)
+    to_update = []
+    for iid in existing:
+        row = dict(('v_' + key, val) for key, val in values[iid].iteritems()
+                   if key not in ('source_id', 'internal_id'))
+        if not row:
+            continue
+        row['b_source_id'] = source_id
+        row['b_internal_id'] = iid
+        to_update.append(row)
+
+    def insert_stmt(_keys):
+        return table.insert()
+
+    def update_stmt(keys):
+        return table.update().where(sqlalchemy.and_(
+            table.c.source_id == sqlalchemy.bindparam('b_source_id'),
+            table.c.internal_id == sqlalchemy.bindparam('b_internal_id'))).\
+            values(dict((key[2:], sqlalchemy.bindparam(key)) for key in keys
+                        if key.startswith('v_')))
+
+    _executemany_grouped(session, insert_stmt, to_insert)
+    _executemany_grouped(session, update_stmt, to_update)
+    _LOG.debug('bulk_save_articles: src=%r inserted=%d updated=%d',
+               source_id, len(to_insert), len(to_update))
+    return len(to_insert) + len(to_update)
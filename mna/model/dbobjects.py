@@ -287,6 +287,45 @@ class SourceLog(BaseModelMixin, Base):
                             order_by="SourceLog.date"))
 
 
+class SourceTiming(BaseModelMixin, Base):
+    """Timings of one source refresh; durations in ms"""
+
+    __tablename__ = "sources_timings"
+
+    # database id
+    oid = Column(Integer, primary_key=True)
+    date = Column(DateTime, default=datetime.datetime.now)
+    # downloading pages (in fetch and parse stages)
+    download = Column(Integer, default=0)
+    # source processing (get_items) without downloading
+    fetch = Column(Integer, default=0)
+    # creating articles without downloading
+    parse = Column(Integer, default=0)
+    # filtering articles
+    filter = Column(Integer, default=0)
+    # storing in database
+    store = Column(Integer, default=0)
+    # from start to stored
+    total = Column(Integer, default=0)
+    # downloaded bytes
+    bytes = Column(Integer, default=0)
+    articles = Column(Integer, default=0)
+    error = Column(Boolean, default=False)
+    # number of responses: 200 (content downloaded) and 304 (not modified)
+    modified = Column(Integer, default=0)
+    not_modified = Column(Integer, default=0)
+    # number of responses from http cache
+    cached = Column(Integer, default=0)
+    # parsing skipped - content identical to previous one
+    unchanged = Column(Boolean, default=False)
+
+    source_id = Column(Integer, ForeignKey("sources.oid"), index=True)
+    source = orm.relationship(
+        Source,
+        backref=orm.backref("timings", cascade="all, delete-orphan",
+                            lazy='dynamic'))
+
+
 class AppMeta(BaseModelMixin, Base):
     """Application metadata object. """
 
@@ -11,26 +11,36 @@ import os.path
 import hashlib
 import datetime
 import logging
-import difflib
 import re
 import locale
 import codecs
 
-from PyQt4 import QtGui
-
 from mna.model import base
 from mna.model import db
 from mna.model import dbobjects as DBO
-from mna.gui import _validators
-
-from . import frm_sett_filemon_ui
+from mna.lib import appconfig
+from mna.lib import fingerprint
 
 _LOG = logging.getLogger(__name__)
 
+# compiled selectors: selector -> regular expression
+_SELECTORS = {}
+_SELECTORS_CACHE_SIZE = 50
+
+
+def _compile_selector(selector):
+    cselector = _SELECTORS.get(selector)
+    if cselector is None:
+        if len(_SELECTORS) >= _SELECTORS_CACHE_SIZE:
+            _SELECTORS.clear()
+        cselector = _SELECTORS[selector] = re.compile(
+            selector, re.M | re.U | re.L | re.I)
+    return cselector
+
 
 def get_file_parts(content, selector):
     """ Find all elements of `page` by `selector` - regular expression. """
-    cselector = re.compile(selector, re.M | re.U | re.L | re.I)
+    cselector = _compile_selector(selector)
     return ((part, create_checksum(part))
             for part in cselector.findall(content))
 
@@ -41,26 +51,26 @@ def create_checksum(data):
     return md5.hexdigest().lower()
 
 
-def articles_similarity(art1, art2):
-    return difflib.SequenceMatcher(None, art1, art2).ratio()
+def get_known_checksums(session, source_id):
+    """ Get checksums (internal_id) of all parts stored for `source_id`. """
+    session = session or db.Session()
+    return set(row[0] for row
+               in session.query(DBO.Article.internal_id).
+               filter_by(source_id=source_id))
 
 
-def accept_part(session, source_id, checksum):
-    """ Check is given part don't already exists in database for given  part
-        `checksum` and `source_id`.
-    """
-    return not db.exists(DBO.Article, session=session,
-                         internal_id=checksum, source_id=source_id)
-
-
-def accept_file(content, source, threshold):
+def accept_file(content, sig, source, threshold):
     """ Check is check similarity ratio if `threshold`  given -
     reject files with similarity ratio > threshold.
+    Similarity is estimated by signatures (`sig` is signature of `content`).
     """
     # find last article
     last = source.get_last_article()
     if last:
-        similarity = articles_similarity(last.content, content)
+        similarity = fingerprint.compare(
+            content, sig, last, threshold,
+            appconfig.AppConfig().get('sources.similarity_exact_margin',
+                                      fingerprint.EXACT_MARGIN))
         _LOG.debug("similarity: %r %r", similarity, threshold)
         if similarity > threshold:
             _LOG.debug("Article skipped - similarity %r > %r",
@@ -69,75 +79,12 @@ def accept_file(content, source, threshold):
     return True
 
 
-class FrmSettFilemon(QtGui.QFrame):  # pylint:disable=no-member
-    def __init__(self, parent=None):
-        QtGui.QFrame.__init__(self, parent)  # pylint:disable=no-member
-        self._ui = frm_sett_filemon_ui.Ui_FrmSettFilemon()
-        self._ui.setupUi(self)
-        self._ui.b_select_file.clicked.connect(self._on_filename_choice)
-
-    def validate(self):
-        try:
-            _validators.validate_empty_string(self._ui.e_filename, 'filename')
-            if self._ui.rb_scan_parts.isChecked():
-                _validators.validate_empty_string(self._ui.e_regex,
-                                                  'expression')
-        except _validators.ValidationError:
-            return False
-        if self._ui.rb_scan_parts.isChecked():
-            cmre = None
-            try:
-                cmre = re.compile(self._ui.e_regex.toPlainText().strip(),
-                                  re.M | re.U | re.L | re.I)
-            finally:
-                pass
-            if not cmre:
-                _LOG.debug("invalid regex")
-                self._ui.e_regex.setFocus()
-                return False
-        return True
-
-    def from_window(self, source):
-        source.conf["filename"] = self._ui.e_filename.text()
-        source.conf["regex"] = self._ui.e_regex.toPlainText()
-        source.conf["similarity"] = \
-            self._ui.sb_similarity_ratio.value() / 100.0
-        if self._ui.rb_scan_file.isChecked():
-            source.conf["mode"] = "page"
-        else:
-            source.conf["mode"] = "part"
-        return True
-
-    def to_window(self, source):
-        self._ui.e_filename.setText(source.conf.get("filename") or "")
-        self._ui.e_regex.setPlainText(source.conf.get("regex") or "")
-        self._ui.sb_similarity_ratio.setValue((source.conf.get('similarity')
-                                               or 0.5) * 100.0)
-        scan_part = source.conf.get("mode") == "part"
-        self._ui.rb_scan_file.setChecked(not scan_part)
-        self._ui.rb_scan_file.toggled.emit(not scan_part)
-        self._ui.rb_scan_parts.setChecked(scan_part)
-        self._ui.rb_scan_parts.toggled.emit(scan_part)
-
-    def _on_filename_choice(self):
-        curr_filename = self._ui.e_filename.text()
-        if curr_filename:
-            curr_filename = os.path.expanduser(curr_filename)
-        # pylint:disable=no-member
-        filename = QtGui.QFileDialog.getOpenFileName(
-            self,
-            self.tr("Select file"),  # pylint:disable=no-member
-            curr_filename,
-            self.tr("All Files (*);;Text Files (*.txt)"))
-        if filename:
-            self._ui.e_filename.setText(filename)
-
-
 class FileSource(base.AbstractSource):
     """Load article from plain file"""
 
     name = "Plain File Source"
-    conf_panel_class = FrmSettFilemon
+    conf_panel_class = base.LazyClass(
+        "mna.plugins.filemon.frm_sett_filemon.FrmSettFilemon")
 
     def __init__(self, conf):
         super(FileSource, self).__init__(conf)
@@ -165,14 +112,16 @@ class FileSource(base.AbstractSource):
         content = self._get_file_content(filename)
         selector = self.cfg.conf.get('regex')
         if self.cfg.conf.get("mode") == "part" and selector:
+            known = get_known_checksums(session, self.cfg.oid)
             articles = (self._create_article(part, checksum)
                         for part, checksum
                         in get_file_parts(content, selector)
-                        if accept_part(session, self.cfg.oid, checksum))
+                        if checksum not in known)
         else:
+            sig = fingerprint.signature(content)
             articles = (
-                [self._create_article(content)]
-                if accept_file(content, self.cfg,
+                [self._create_article(content, sig=sig)]
+                if accept_file(content, sig, self.cfg,
                                self.cfg.conf.get('similarity') or 1)
                 else [])
 
@@ -208,7 +157,7 @@ class FileSource(base.AbstractSource):
             raise base.GetArticleException("Load file error: %s" % err)
         return None
 
-    def _create_article(self, part, checksum=None):
+    def _create_article(self, part, checksum=None, sig=None):
         filename = self._filename
         file_modification = datetime.datetime.fromtimestamp(
             os.path.getmtime(filename))
@@ -221,6 +170,7 @@ class FileSource(base.AbstractSource):
         art.title = filename + " " + file_modification.strftime("%x %X")
         art.published = file_modification
         art.link = None
+        art.meta = {fingerprint.META_KEY: sig} if sig else {}
         return art
 
     def is_file_updated(self, filename, max_age_load):
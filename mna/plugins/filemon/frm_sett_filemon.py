@@ -0,0 +1,84 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" File source plugin - configuration gui """
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2015"
+__version__ = "2015-06-20"
+
+import os.path
+import logging
+import re
+
+from PyQt4 import QtGui
+
+from mna.gui import _validators
+
+from . import frm_sett_filemon_ui
+
+_LOG = logging.getLogger(__name__)
+
+
+class FrmSettFilemon(QtGui.QFrame):  # pylint:disable=no-member
+    def __init__(self, parent=None):
+        QtGui.QFrame.__init__(self, parent)  # pylint:disable=no-member
+        self._ui = frm_sett_filemon_ui.Ui_FrmSettFilemon()
+        self._ui.setupUi(self)
+        self._ui.b_select_file.clicked.connect(self._on_filename_choice)
+
+    def validate(self):
+        try:
+            _validators.validate_empty_string(self._ui.e_filename, 'filename')
+            if self._ui.rb_scan_parts.isChecked():
+                _validators.validate_empty_string(self._ui.e_regex,
+                                                  'expression')
+        except _validators.ValidationError:
+            return False
+        if self._ui.rb_scan_parts.isChecked():
+            cmre = None
+            try:
+                cmre = re.compile(self._ui.e_regex.toPlainText().strip(),
+                                  re.M | re.U | re.L | re.I)
+            finally:
+                pass
+            if not cmre:
+                _LOG.debug("invalid regex")
+                self._ui.e_regex.setFocus()
+                return False
+        return True
+
+    def from_window(self, source):
+        source.conf["filename"] = self._ui.e_filename.text()
+        source.conf["regex"] = self._ui.e_regex.toPlainText()
+        source.conf["similarity"] = \
+            self._ui.sb_similarity_ratio.value() / 100.0
+        if self._ui.rb_scan_file.isChecked():
+            source.conf["mode"] = "page"
+        else:
+            source.conf["mode"] = "part"
+        return True
+
+    def to_window(self, source):
+        self._ui.e_filename.setText(source.conf.get("filename") or "")
+        self._ui.e_regex.setPlainText(source.conf.get("regex") or "")
+        self._ui.sb_similarity_ratio.setValue((source.conf.get('similarity')
+                                               or 0.5) * 100.0)
+        scan_part = source.conf.get("mode") == "part"
+        self._ui.rb_scan_file.setChecked(not scan_part)
+        self._ui.rb_scan_file.toggled.emit(not scan_part)
+        self._ui.rb_scan_parts.setChecked(scan_part)
+        self._ui.rb_scan_parts.toggled.emit(scan_part)
+
+    def _on_filename_choice(self):
+        curr_filename = self._ui.e_filename.text()
+        if curr_filename:
+            curr_filename = os.path.expanduser(curr_filename)
+        # pylint:disable=no-member
+        filename = QtGui.QFileDialog.getOpenFileName(
+            self,
+            self.tr("Select file"),  # pylint:disable=no-member
+            curr_filename,
+            self.tr("All Files (*);;Text Files (*.txt)"))
+        if filename:
+            self._ui.e_filename.setText(filename)
@@ -9,6 +9,8 @@ __version__ = "2015-02-17"
 
 import datetime
 import logging
+import threading
+import collections
 
 try:
     import simplejson as json
@@ -18,11 +20,21 @@ except ImportError:
 from mna.model import base
 from mna.model import dbobjects as DBO
 from mna.lib import websupport
+from mna.lib import appconfig
 
 _LOG = logging.getLogger(__name__)
 
 _TOP_STORIES_URL = r'https://hacker-news.firebaseio.com/v0/topstories.json'
 _GET_STORY_URL = r'https://hacker-news.firebaseio.com/v0/item/%d.json'
+# default number of concurrently loaded stories
+_CONCURRENCY = 8
+# default max time (sec) of loading one story
+_ITEM_TIMEOUT = 30
+
+# recently loaded stories: story id -> story (None for deleted)
+_STORIES_CACHE = collections.OrderedDict()
+_STORIES_CACHE_SIZE = 500
+_STORIES_CACHE_LOCK = threading.Lock()
 
 
 # pylint: disable=too-few-public-methods
@@ -87,9 +99,7 @@ class HNSource(base.AbstractSource):
 
         self.cfg.meta['last_sid'] = max(stories_id)
         stories_id = self._limit_articles(stories_id, max_load)
-        stories = (self._get_story(sid) for sid in stories_id)
-        # filter broken stories
-        stories = (story for story in stories if story is not None)
+        stories = self._get_stories(stories_id)
 
         # filter by time
         min_date_to_load = self._get_min_date_to_load(max_age_load)
@@ -108,33 +118,45 @@ class HNSource(base.AbstractSource):
             List of stories id
         """
         try:
-            info, page = websupport.download_page(
-                _TOP_STORIES_URL, self.cfg.meta.get('etag'),
-                self.cfg.meta.get('last-modified'))
+            _info, page = self._download(_TOP_STORIES_URL)
         except websupport.LoadPageError, err:
             self._log_error("Error loading top stories page: " + str(err))
-            raise base.GetArticleException("Get web page error: %s" % err)
+            raise base.GetArticleException("Get web page error: %s" % err,
+                                           err.retry_after)
+        if not page or self._is_content_unchanged(page):
+            return None
+        return json.loads(page.decode('utf-8'))
 
-        self.cfg.meta['last-modified'] = info['_modified']
-        self.cfg.meta['etag'] = info.get('etag')
-        return json.loads(page.decode('utf-8')) if page else None
+    def _get_stories(self, stories_id):
+        """ Load stories by `stories_id`; stories not found in cache are
+        downloaded concurrently.
 
-    def _get_story(self, story_id):
-        """ Load one article by `story_id` """
-        try:
-            _LOG.debug('_get_story: sid=%r', story_id)
-            info, page = websupport.download_page(_GET_STORY_URL % story_id)
-        except websupport.LoadPageError, err:
-            _LOG.error('_get_story %d error %r', story_id, err)
-            self._log_error("Error loading story %d: %s" % (story_id, err))
-            return None
-        if not page:
-            return None
-        story = json.loads(page)
-        if story.get('deleted'):  # pylint: disable=maybe-no-member
-            return None
-        story['time_parsed'] = datetime.datetime.fromtimestamp(story['time'])
-        return story
+        Returns:
+            List of loaded stories in order of `stories_id`
+        """
+        stories_id = list(stories_id)
+        with _STORIES_CACHE_LOCK:
+            stories = dict((sid, _STORIES_CACHE[sid]) for sid in stories_id
+                           if sid in _STORIES_CACHE)
+        to_load = [sid for sid in stories_id if sid not in stories]
+        _LOG.debug('_get_stories: %d cached, %d to load', len(stories),
+                   len(to_load))
+        aconf = appconfig.AppConfig()
+        pages = websupport.download_pages(
+            [_GET_STORY_URL % sid for sid in to_load],
+            aconf.get('hn.concurrency', _CONCURRENCY),
+            aconf.get('hn.item_timeout', _ITEM_TIMEOUT))
+        loaded = {}
+        for story_id, (_url, page, error) in zip(to_load, pages):
+            if error is not None:
+                _LOG.error('_get_stories %d error %r', story_id, error)
+                self._log_error("Error loading story %d: %s" % (story_id,
+                                                                error))
+            elif page:
+                loaded[story_id] = _parse_story(page)
+        _cache_stories(loaded)
+        stories.update(loaded)
+        return [stories[sid] for sid in stories_id if stories.get(sid)]
 
     def _create_article(self, story):
         """ Create article from `story`. """
@@ -148,3 +170,22 @@ class HNSource(base.AbstractSource):
         art.author = story['by']
         art.meta = {key: story.get(key) for key in ('score', 'type')}
         return art
+
+
+def _parse_story(page):
+    """ Parse story json; return None for deleted stories. """
+    story = json.loads(page)
+    if story.get('deleted'):  # pylint: disable=maybe-no-member
+        return None
+    story['time_parsed'] = datetime.datetime.fromtimestamp(story['time'])
+    return story
+
+
+def _cache_stories(stories):
+    """ Put `stories` into cache; remove the oldest ones. """
+    with _STORIES_CACHE_LOCK:
+        for story_id, story in stories.iteritems():
+            _STORIES_CACHE.pop(story_id, None)
+            _STORIES_CACHE[story_id] = story
+        while len(_STORIES_CACHE) > _STORIES_CACHE_SIZE:
+            _STORIES_CACHE.popitem(last=False)
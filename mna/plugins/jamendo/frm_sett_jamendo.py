@@ -0,0 +1,32 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Jamendo source plugin - configuration gui """
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2014-2015"
+__version__ = "2015-06-20"
+
+from PyQt4 import QtGui
+
+from . import frm_sett_jamendo_ui
+
+
+class FrmSettJamendo(QtGui.QFrame):  # pylint: disable=no-member
+    def __init__(self, parent=None):
+        QtGui.QFrame.__init__(self, parent)  # pylint: disable=no-member
+        self._ui = frm_sett_jamendo_ui.Ui_FrmSettRss()
+        self._ui.setupUi(self)
+
+    def validate(self):
+        if not self._ui.e_artist.text():
+            self._ui.e_artist.setFocus()
+            return False
+        return True
+
+    def from_window(self, source):
+        source.conf["artist_id"] = self._ui.e_artist.text()
+        return True
+
+    def to_window(self, source):
+        self._ui.e_artist.setText(str(source.conf.get("artist_id") or ""))
@@ -15,52 +15,187 @@ import datetime
 import logging
 import urllib
 import locale
+import threading
+import time
 
 try:
     import simplejson as json
 except ImportError:
     import json
 
-from PyQt4 import QtGui
-
 from mna.model import base
 from mna.model import dbobjects as DBO
 from mna.lib import websupport
-
-from . import frm_sett_jamendo_ui
+from mna.lib import appconfig
 
 _LOG = logging.getLogger(__name__)
 
 # TODO: get own client id
 _CLIENT_ID = "f919df7d"
 _COUNTRY_CODE = locale.getdefaultlocale()[0][:2]
-
-
-class FrmSettJamendo(QtGui.QFrame):  # pylint: disable=no-member
-    def __init__(self, parent=None):
-        QtGui.QFrame.__init__(self, parent)  # pylint: disable=no-member
-        self._ui = frm_sett_jamendo_ui.Ui_FrmSettRss()
-        self._ui.setupUi(self)
-
-    def validate(self):
-        if not self._ui.e_artist.text():
-            self._ui.e_artist.setFocus()
-            return False
-        return True
-
-    def from_window(self, source):
-        source.conf["artist_id"] = self._ui.e_artist.text()
-        return True
-
-    def to_window(self, source):
-        self._ui.e_artist.setText(str(source.conf.get("artist_id") or ""))
+_ALBUMS_URL = 'https://api.jamendo.com/v3.0/artists/albums?'
+# max number of artists id in one api call
+_MAX_IDS = 10
+# default time (sec) of collecting requests for one api call
+_BATCH_WINDOW = 1.0
+# default time (sec) without new requests after which api is called before
+# end of window
+_BATCH_IDLE = 0.2
+
+
+def _load_albums(query):
+    """ Call artists/albums api with `query`.
+
+    Returns:
+        (ok, http_info, response header, response result)
+    """
+    url = _ALBUMS_URL + urllib.urlencode(query)
+    _LOG.debug('jamendo._load_albums: %r', url)
+    info, page = websupport.download_page(url)
+    if not page:
+        _LOG.info("jamendo._load_albums empty page: %r", info)
+        return False, info, None, None
+
+    page = json.loads(page.decode('utf-8'))
+    if not page:
+        _LOG.info("jamendo._load_albums empty result: %r", info)
+        return False, info, None, None
+
+    headers = page.get('headers')  # pylint: disable=maybe-no-member
+    results = page.get('results')  # pylint: disable=maybe-no-member
+    if not headers or headers['status'] != 'success':
+        _LOG.info("jamendo._load_albums error result: %r", headers)
+        return False, info, headers, results
+    return True, info, headers, results
+
+
+class _Batch(object):
+    """ Artists which albums are loaded by one api call. """
+
+    def __init__(self):
+        # artist id -> min date
+        self.artists = {}
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def load(self, max_date):
+        """ Load albums released from the earliest requested date. """
+        query = {'client_id': _CLIENT_ID,
+                 'format': 'json',
+                 # many values are separated by space
+                 'id': " ".join(str(aid) for aid in sorted(self.artists))}
+        dates = self.artists.values()
+        if all(dates):
+            query['album_datebetween'] = min(dates) + "_" + max_date
+        try:
+            self.result = _load_albums(query)
+        except Exception, err:  # pylint:disable=broad-except
+            # reraised for all requesters by `get_artist`
+            _LOG.debug("_Batch.load error: %r", err)
+            self.error = err
+        finally:
+            self.done.set()
+
+    def get_artist(self, artist_id):
+        """ Get result for one artist; skip albums released before date
+        requested for this artist. """
+        if self.error is not None:
+            raise self.error  # pylint:disable=raising-bad-type
+        isok, info, headers, results = self.result
+        if not isok:
+            return isok, info, headers, results
+        min_date = self.artists[artist_id]
+        for artist in results or []:
+            if int(artist['id']) == artist_id:
+                artist = artist.copy()
+                if min_date:
+                    artist['albums'] = [
+                        album for album in artist.get('albums') or []
+                        if album['releasedate'] >= min_date]
+                return True, info, headers, [artist]
+        return True, info, headers, []
+
+
+class _AlbumsBatcher(object):
+    """ Collect requests for albums from sources refreshed concurrently and
+    load them by shared api calls (up to `_MAX_IDS` artists per call).
+
+    First requester waits up to `window` seconds for other requests (but
+    no longer than `idle` seconds from last request) and then call api;
+    others wait for its result.
+
+    Only requests from fetch workers running in the same time are joined,
+    so real size of batch is limited by number of fetch workers (3 for
+    "threads" engine; up to `_MAX_IDS` for "concurrent" engine). Leader
+    blocks its worker for at most `window` seconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # notified on each new request
+        self._joined = threading.Condition(self._lock)
+        self._pending = None
+
+    def get_albums(self, artist_id, min_date, max_date):
+        with self._lock:
+            batch = self._pending
+            leader = batch is None
+            if leader:
+                batch = self._pending = _Batch()
+            if artist_id in batch.artists:
+                # the same artist requested by many sources; load albums
+                # from the earliest date (None - all albums)
+                prev_date = batch.artists[artist_id]
+                if prev_date is None or min_date is None:
+                    min_date = None
+                else:
+                    min_date = min(prev_date, min_date)
+            batch.artists[artist_id] = min_date
+            if len(batch.artists) >= _MAX_IDS:
+                self._pending = None
+                batch.full.set()
+            self._joined.notify_all()
+        if leader:
+            self._wait_for_requests(batch)
+            _LOG.debug("_AlbumsBatcher: loading albums for %d artists",
+                       len(batch.artists))
+            batch.load(max_date)
+        else:
+            batch.done.wait()
+        return batch.get_artist(artist_id)
+
+    def _wait_for_requests(self, batch):
+        """ Wait for other requests until `batch` is full, window elapsed
+        or no new request come in idle time; close batch. """
+        aconf = appconfig.AppConfig()
+        deadline = time.time() + aconf.get('jamendo.batch_window',
+                                           _BATCH_WINDOW)
+        idle = aconf.get('jamendo.batch_idle', _BATCH_IDLE)
+        with self._lock:
+            while not batch.full.is_set():
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                requests = len(batch.artists)
+                self._joined.wait(min(idle, remaining))
+                if len(batch.artists) == requests:
+                    # no new requests
+                    break
+            if self._pending is batch:
+                self._pending = None
+
+
+_BATCHER = _AlbumsBatcher()
 
 
 class JamendoArtistAlbumsSource(base.AbstractSource):
     """Load albums for configured artist from Jamendo"""
 
     name = "Jamendo - Artist's Albums"
-    conf_panel_class = FrmSettJamendo
+    conf_panel_class = base.LazyClass(
+        "mna.plugins.jamendo.frm_sett_jamendo.FrmSettJamendo")
     default_icon = ":plugins-jamendo/jamendo-icon.png"
 
     def __init__(self, cfg):
@@ -134,43 +269,22 @@ class JamendoArtistAlbumsSource(base.AbstractSource):
         """
         _LOG.debug('JamendoArtistAlbumsSource._get_albums(%r %r %r)',
                    artist_id, min_date, max_date)
-        url = 'https://api.jamendo.com/v3.0/artists/albums?'
-        query = {
-            'client_id': _CLIENT_ID,
-            'format': 'json',
-        }
-        try:
-            query['id'] = int(artist_id)
-        except ValueError:
-            query['name'] = artist_id
-        if min_date:
-            query['album_datebetween'] = min_date + "_" + max_date
-        url += urllib.urlencode(query)
-        _LOG.debug('JamendoArtistAlbumsSource._get_albums: %r', url)
         try:
-            info, page = websupport.download_page(url)
+            try:
+                artist_id = int(artist_id)
+            except ValueError:
+                # artists given by name are loaded separately
+                query = {'client_id': _CLIENT_ID,
+                         'format': 'json',
+                         'name': artist_id}
+                if min_date:
+                    query['album_datebetween'] = min_date + "_" + max_date
+                return _load_albums(query)
+            return _BATCHER.get_albums(artist_id, min_date, max_date)
         except websupport.LoadPageError, err:
             self._log_error("Error loading page: " + str(err))
-            raise base.GetArticleException("Get web page error: %s" % err)
-
-        if not page:
-            _LOG.info("JamendoArtistAlbumsSource._get_albums empty page: %r",
-                      info)
-            return False, info, None, None
-
-        page = json.loads(page.decode('utf-8'))
-        if not page:
-            _LOG.info("JamendoArtistAlbumsSource._get_albums empty result: %r",
-                      info)
-            return False, info, None, None
-
-        headers = page.get('headers')  # pylint: disable=maybe-no-member
-        results = page.get('results')  # pylint: disable=maybe-no-member
-        if not headers or headers['status'] != 'success':
-            _LOG.info("JamendoArtistAlbumsSource._get_albums error result: %r",
-                      page['headers'])
-            return False, info, headers, results
-        return True, info, headers, results
+            raise base.GetArticleException("Get web page error: %s" % err,
+                                           err.retry_after)
 
     def _prepare_albums(self, albums):  # pylint:disable=no-self-use
         for album in albums:
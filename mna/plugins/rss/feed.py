@@ -0,0 +1,52 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" Feeds parsing; result is converted to plain, picklable structures so
+parsing may be done in `procpool` process.
+
+Copyright (c) Karol Będkowski, 2015
+
+This file is part of mna
+Licence: GPLv2+
+"""
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2015"
+__version__ = "2015-06-13"
+
+import time
+
+import feedparser
+
+feedparser.PARSE_MICROFORMATS = 0
+
+
+def _to_plain(value):
+    if isinstance(value, dict):
+        return dict((key, _to_plain(val)) for key, val in value.iteritems())
+    if isinstance(value, time.struct_time):
+        return tuple(value)
+    if isinstance(value, (list, tuple)):
+        return [_to_plain(val) for val in value]
+    if isinstance(value, Exception):
+        return str(value)
+    return value
+
+
+def feed_to_dict(doc):
+    """ Convert feedparser result into dict of plain python objects. """
+    result = _to_plain(doc)
+    # keys available in FeedParserDict only by aliases
+    for key in ('etag', 'modified', 'href'):
+        result[key] = doc.get(key)
+    return result
+
+
+def parse_feed(content, headers=None):
+    """ Parse feed `content` (str) into plain dict.
+
+    Args:
+        content (str): raw feed
+        headers (dict): optional http response headers (lower-case keys)
+    """
+    return feed_to_dict(feedparser.parse(content, response_headers=headers))
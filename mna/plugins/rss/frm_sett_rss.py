@@ -0,0 +1,39 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+""" RSS/Atom source plugin - configuration gui """
+
+__author__ = "Karol Będkowski"
+__copyright__ = "Copyright (c) Karol Będkowski, 2014-2015"
+__version__ = "2015-06-20"
+
+import logging
+
+from PyQt4 import QtGui
+
+from mna.gui import _validators
+
+from . import frm_sett_rss_ui
+
+_LOG = logging.getLogger(__name__)
+
+
+class FrmSettRss(QtGui.QFrame):  # pylint: disable=no-member
+    def __init__(self, parent=None):
+        QtGui.QFrame.__init__(self, parent)  # pylint: disable=no-member
+        self._ui = frm_sett_rss_ui.Ui_FrmSettRss()
+        self._ui.setupUi(self)
+
+    def validate(self):
+        try:
+            _validators.validate_empty_string(self._ui.e_url, 'URL')
+        except _validators.ValidationError:
+            return False
+        return True
+
+    def from_window(self, source):
+        source.conf["url"] = self._ui.e_url.text()
+        return True
+
+    def to_window(self, source):
+        self._ui.e_url.setText(source.conf.get("url") or "")
@@ -13,6 +13,7 @@ from lxml import etree
 
 from mna.model import db
 from mna.model import dbobjects as DBO
+from mna.logic.scheduler import SCHEDULER
 
 
 _LOG = logging.getLogger(__name__)
@@ -59,7 +60,7 @@ def import_opml_file(filename, session=None):
         return 0
     if not xml_data:
         return 0
-    cntr = 0
+    new_sources = []
     for group, items in import_opml(xml_data):
         group_obj = db.get_one(DBO.Group, session, name=group)
         if group_obj is None:
@@ -76,6 +77,7 @@ def import_opml_file(filename, session=None):
                              conf={'url': item['xmlUrl'],
                                    'web': item.get('htmlUrl')})
             group_obj.sources.append(src)  # pylint:disable=maybe-no-member
-            cntr += 1
+            new_sources.append(src)
     session.commit()
-    return cntr
+    SCHEDULER.schedule_all((src.oid, src.next_refresh) for src in new_sources)
+    return len(new_sources)
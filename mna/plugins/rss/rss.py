@@ -12,24 +12,21 @@ import os
 import logging
 import datetime
 import calendar
+import urlparse
 
-import feedparser
 from sqlalchemy import orm
-from PyQt4 import QtGui
 
 from mna.model import base
 from mna.model import db
 from mna.model import dbobjects as DBO
-from mna.gui import _validators
 from mna.lib import websupport
+from mna.lib import procpool
 from . import opml
-from . import frm_sett_rss_ui
+from . import feed as feedsupport
 
 _LOG = logging.getLogger(__name__)
-
-feedparser.PARSE_MICROFORMATS = 0
-feedparser.USER_AGENT = ("Mozilla/5.0 (X11; Linux i686; rv:36.0) "
-                         "Gecko/20100101 Firefox/36.0")
+# response headers not valid for decoded content
+_DECODED_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding')
 
 
 def _ts2datetime(tstruct, default=None):
@@ -41,7 +38,7 @@ def _ts2datetime(tstruct, default=None):
 
 def _entry_hash(entry):
     """ Compute simple checksum for "content" of feed entry """
-    content = entry['content'][0].value if 'content' in entry \
+    content = entry['content'][0]['value'] if entry.get('content') \
         else entry.get('value')
     title = entry.get('title') or ''
     author = entry.get('author') or ''
@@ -49,32 +46,12 @@ def _entry_hash(entry):
     return "".join(map(str, map(hash, (content, title, author, summary))))
 
 
-class FrmSettRss(QtGui.QFrame):  # pylint: disable=no-member
-    def __init__(self, parent=None):
-        QtGui.QFrame.__init__(self, parent)  # pylint: disable=no-member
-        self._ui = frm_sett_rss_ui.Ui_FrmSettRss()
-        self._ui.setupUi(self)
-
-    def validate(self):
-        try:
-            _validators.validate_empty_string(self._ui.e_url, 'URL')
-        except _validators.ValidationError:
-            return False
-        return True
-
-    def from_window(self, source):
-        source.conf["url"] = self._ui.e_url.text()
-        return True
-
-    def to_window(self, source):
-        self._ui.e_url.setText(source.conf.get("url") or "")
-
-
 class RssSource(base.AbstractSource):
     """Rss/Atom source class. """
 
     name = "RSS/Atom Source"
-    conf_panel_class = FrmSettRss
+    conf_panel_class = base.LazyClass(
+        "mna.plugins.rss.frm_sett_rss.FrmSettRss")
     default_icon = ":icons/feed-icon.svg"
 
     def __init__(self, cfg):
@@ -134,42 +111,55 @@ class RssSource(base.AbstractSource):
         source_conf.conf = {'url': org_conf.get('url') or ''}
         return source_conf
 
-    def _get_document(self, url, cntr=10):
+    def _get_document(self, url):
+        """ Download feed by websupport and parse it (optionally in process
+        pool); return plain dict (see `feed.parse_feed`) or None when feed
+        is not modified. """
         _LOG.info("RssSource: src=%d get_document %r", self.cfg.oid, url)
-        if cntr <= 0:
-            raise base.GetArticleException(
-                "Get rss feed error: to many redirections")
-        doc = feedparser.parse(url,
-                               etag=self.cfg.meta.get('etag'),
-                               modified=self.cfg.meta.get('modified'))
-        status = doc.get('status') if doc else 400
-        if status >= 400:
-            self._log_error("Error loading RSS feed: %s" % status)
-            _LOG.error("RssSource: src=%d error getting items from %s, %r, %r",
-                       self.cfg.oid, url, doc, self.cfg)
-            raise base.GetArticleException("Get rss feed error: %r" % status)
-        elif status == 304:
-            _LOG.info("RssSource: src=%s result %d: %r - skipping",
-                      self.cfg.oid, status, doc.get('debug_message'))
+        try:
+            info, content = self._download(
+                url, self.cfg.meta.get('etag'), self.cfg.meta.get('modified'))
+        except websupport.LoadPageError, err:
+            self._log_error("Error loading RSS feed: %s" % err)
+            _LOG.error("RssSource: src=%d error getting items from %s, %r",
+                       self.cfg.oid, url, err)
+            raise base.GetArticleException("Get rss feed error: %s" % err,
+                                           err.retry_after)
+        final_url = info.get('_redirect')
+        if final_url:
+            if info.get('_permanent_redirect'):
+                self.cfg.meta["url.org"] = url
+                self.cfg.conf["url"] = final_url
+                _LOG.info("RssSource: src=%s permanent redirects to %s",
+                          self.cfg.oid, final_url)
+                self._log_info("Permanent redirect to %s; updating "
+                               "configuration" % final_url)
+            else:
+                _LOG.info("RssSource: src=%s temporary redirects to %s",
+                          self.cfg.oid, final_url)
+                self._log_info("Temporary redirect to %s" % final_url)
+        if content is None:
+            _LOG.info("RssSource: src=%s not modified - skipping",
+                      self.cfg.oid)
+            return None
+        if self._is_content_unchanged(content):
+            _LOG.info("RssSource: src=%s content not changed - skipping",
+                      self.cfg.oid)
+            self._log_debug("feed content not changed")
             return None
-        elif status == 301:  # permanent redirects
-            self.cfg.meta["url.org"] = url
-            self.cfg.conf["url"] = doc.href
-            _LOG.info("RssSource: src=%s permanent redirects to %s",
-                      self.cfg.oid, doc.href)
-            self._log_info("Permanent redirect to %s; updating configuration"
-                           % doc.href)
-            return self._get_document(doc.href, cntr=cntr-1)
-        elif status == 302:  # temporary redirects
-            _LOG.info("RssSource: src=%s temporary redirects to %s",
-                      self.cfg.oid, doc.href)
-            self._log_info("Temporary redirect to %s" % doc.href)
-            return self._get_document(doc.href, cntr=cntr-1)
-        elif status != 200:
-            self._log_error("Error loading RSS feed: %s" % status)
-            _LOG.error("RssSource: src=%d error getting items from %s, %r, %r",
-                       self.cfg.oid, url, doc, self.cfg)
-            raise base.GetArticleException("Get rss feed error: %r" % status)
+        # content is already decoded by websupport
+        headers = dict((key.lower(), val) for key, val in info.iteritems()
+                       if not key.startswith('_') and
+                       key.lower() not in _DECODED_HEADERS)
+        # content is parsed without url, so feedparser resolve relative
+        # links against content-location
+        headers['content-location'] = urlparse.urljoin(
+            final_url or url, headers.get('content-location') or '')
+        doc = procpool.call(feedsupport.parse_feed, content, headers)
+        doc['status'] = info['_status']
+        doc['href'] = final_url or url
+        doc['etag'] = headers.get('etag')
+        doc['modified'] = headers.get('last-modified')
         _LOG.info("RssSource: src=%d get_document done %r", self.cfg.oid, url)
         return doc
 
@@ -179,8 +169,8 @@ class RssSource(base.AbstractSource):
         self.cfg.meta['etag'] = doc.get('etag')
         self.cfg.meta['modified'] = doc.get('modified')
         if self.cfg.title == "":
-            if 'title' in doc.feed:
-                self.cfg.title = doc.feed.title
+            if 'title' in doc['feed']:
+                self.cfg.title = doc['feed']['title']
                 self.mark_conf_updated()
         if not self.cfg.icon_id:
             icon, icon_name = self._get_icon(doc)
@@ -208,7 +198,7 @@ class RssSource(base.AbstractSource):
                 entry.get('link'), entry.get('title'), entry.get('author'),
                 self.__class__.get_name())
 
-        content = entry['content'][0].value if 'content' in entry \
+        content = entry['content'][0]['value'] if entry.get('content') \
             else entry.get('value')
         art = art_cache.get(internal_id)
         meta = art.meta.copy() if art and art.meta else {}
@@ -251,21 +241,22 @@ class RssSource(base.AbstractSource):
         return dict((row.internal_id, row) for row in rows)
 
     def _get_icon(self, content):
-        if 'icon' in content.feed:
+        feed = content['feed']
+        if 'icon' in feed:
             try:
-                info, page = websupport.download_page(content.feed.icon,
+                info, page = websupport.download_page(feed['icon'],
                                                       None, None)
                 if page:
-                    return page, os.path.basename(content.feed.icon)
+                    return page, os.path.basename(feed['icon'])
             except websupport.LoadPageError, err:
                 _LOG.info("RssSource: src=%d _get_icon error %r",
                           self.cfg.oid, err)
-        if 'link' in content.feed:
+        if 'link' in feed:
             try:
-                info, page = websupport.download_page(content.feed.link,
+                info, page = websupport.download_page(feed['link'],
                                                       None, None)
                 if page:
-                    icon = websupport.get_icon(content.feed.link, page,
+                    icon = websupport.get_icon(feed['link'], page,
                                                info['_encoding'])
                     if icon and icon[0]:
                         return icon
@@ -286,6 +277,7 @@ class OpmlImportTool(base.AbstractTool):
         return True
 
     def run(self, parent, _sel_article, _sel_source, _sel_group):
+        from PyQt4 import QtGui
         fname = QtGui.QFileDialog.getOpenFileName(  # pylint:disable=no-member
             parent, "Select OPML file")
         if fname:
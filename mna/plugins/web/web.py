@@ -10,13 +10,13 @@ __version__ = "2015-01-18"
 import hashlib
 import datetime
 import logging
-import difflib
 
 from mna.model import base
 from mna.model import dbobjects as DBO
 from mna.lib import websupport
-
-from . import frm_sett_web
+from mna.lib import procpool
+from mna.lib import appconfig
+from mna.lib import fingerprint
 
 _LOG = logging.getLogger(__name__)
 
@@ -36,7 +36,10 @@ def _create_config_hash(source):
 def accept_page(article, _session, source, threshold):
     """ Check is page change from last time, optionally check similarity ratio
         if `threshold`  given - reject pages with similarity ratio > threshold.
+        Similarity is estimated by signatures (see `fingerprint`).
     """
+    sig = fingerprint.signature(article.content)
+    article.meta[fingerprint.META_KEY] = sig
     # find last article
     last = source.get_last_article()
     if last:
@@ -46,9 +49,10 @@ def accept_page(article, _session, source, threshold):
             if not last_conf_hash or \
                     last_conf_hash != _create_config_hash(source):
                 return True
-        content = article.content
-        similarity = difflib.SequenceMatcher(None, last.content,
-                                             content).ratio()
+        similarity = fingerprint.compare(
+            article.content, sig, last, threshold,
+            appconfig.AppConfig().get('sources.similarity_exact_margin',
+                                      fingerprint.EXACT_MARGIN))
         _LOG.debug("similarity: %r %r", similarity, threshold)
         if similarity > threshold:
             if __debug__:
@@ -65,7 +69,8 @@ class WebSource(base.AbstractSource):
     """Load article from website"""
 
     name = "Web Page Source"
-    conf_panel_class = frm_sett_web.FrmSettWeb
+    conf_panel_class = base.LazyClass(
+        "mna.plugins.web.frm_sett_web.FrmSettWeb")
     default_icon = ":icons/web-icon.svg"
 
     def __init__(self, cfg):
@@ -100,20 +105,36 @@ class WebSource(base.AbstractSource):
                       self.cfg.oid, url)
             self._log_debug("page not modified")
             return None
+        if self._is_content_unchanged(page):
+            _LOG.info("WebSource.get_items %r from %r - content not changed",
+                      self.cfg.oid, url)
+            self._log_debug("page content not changed")
+            return None
+
+        # page is parsed once for page info and articles
+        need_page_info = not self.cfg.icon_id or self.cfg.title == ""
+        page_updated = self.is_page_updated(info, max_age_load)
+        if not page_updated and not need_page_info:
+            _LOG.info("WebSource.get_items src=%r page not updated",
+                      self.cfg.oid)
+            self._log_debug("page not updated")
+            return None
 
-        self._download_page_info(url, page, info)
+        parsed = self._get_articles(info, page, need_page_info)
+        if need_page_info:
+            self._download_page_info(url, parsed)
 
-        if not self.is_page_updated(info, max_age_load):
+        if not page_updated:
             _LOG.info("WebSource.get_items src=%r page not updated",
                       self.cfg.oid)
             self._log_debug("page not updated")
             return None
 
-        parts = self._get_articles(info, page)
         articles = (DBO.Article(content=part,
                                 internal_id=_create_checksum(part),
+                                title=title,
                                 meta={})
-                    for part in parts)
+                    for part, title in parsed['parts'])
         articles = self._filter_articles(articles, session)
         articles = (self._update_article_meta(art, info) for art in articles)
         articles = self._limit_articles(articles, max_load)
@@ -146,30 +167,23 @@ class WebSource(base.AbstractSource):
 
     def _download_page(self, url):
         try:
-            info, page = websupport.download_page(
-                url, self.cfg.meta.get('etag'),
-                self.cfg.meta.get('last-modified'))
+            info, page = self._download(url)
         except websupport.LoadPageError, err:
             self._log_error("Error loading page: " + str(err))
-            raise base.GetArticleException("Get web page error: %s" % err)
-
-        self.cfg.meta['last-modified'] = info['_modified']
-        self.cfg.meta['etag'] = info.get('etag')
+            raise base.GetArticleException("Get web page error: %s" % err,
+                                           err.retry_after)
         return info, page
 
-    def _get_articles(self, info, page):
+    def _get_articles(self, info, page, with_page_info=False):
+        """ Parse page and find articles (see
+        `websupport.get_page_articles`). """
         selector = self.cfg.conf.get('xpath')
         mode = self.cfg.conf.get("mode")
-        articles = []
-        if mode == "part" and selector:
-            articles = websupport.get_page_part(info, page, selector)
-        elif mode == "page_one_part" and selector:
-            parts = list(websupport.get_page_part(info, page, selector))
-            if parts:
-                articles = [parts[0]]
-        else:
-            articles = websupport.get_page_part(info, page, None)
-        return articles
+        if mode not in ("part", "page_one_part"):
+            selector = None
+        return procpool.call(websupport.get_page_articles, info, page,
+                             selector, with_page_info,
+                             mode == "page_one_part")
 
     def _filter_articles(self, articles, session):
         selector = self.cfg.conf.get('xpath')
@@ -188,8 +202,6 @@ class WebSource(base.AbstractSource):
 
     def _update_article_meta(self, article, info):
         article.score = self.cfg.initial_score
-        article.title = websupport.get_title(article.content,
-                                             info['_encoding'])
         article.updated = self._now
         article.published = info.get('_last-modified')
         article.link = self.cfg.conf.get('url')
@@ -215,10 +227,10 @@ class WebSource(base.AbstractSource):
             return False
         return True
 
-    def _download_page_info(self, url, page, info):
+    def _download_page_info(self, url, parsed):
         """ Get page icon, title, etc. """
         if not self.cfg.icon_id:
-            icon, name = websupport.get_icon(url, page, info['_encoding'])
+            icon, name = websupport.download_icon(url, parsed['icons'])
             if icon:
                 name = "_".join(('src', str(self.cfg.oid), name))
                 self.cfg.icon_id = name
@@ -227,5 +239,5 @@ class WebSource(base.AbstractSource):
                 self.cfg.icon_id = self.default_icon
             self.mark_conf_updated()
         if self.cfg.title == "":
-            self.cfg.title = websupport.get_title(page, info['_encoding'])
+            self.cfg.title = parsed['title']
             self.mark_conf_updated()